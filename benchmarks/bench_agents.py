@@ -0,0 +1,235 @@
+"""
+Agent benchmarks against the local fake Gmail and OpenAI servers
+Runs full campaigns for both agent classes in each analysis mode and reports
+emails/sec, API calls per email and peak memory, plus per-call timings for the
+individual agent methods
+
+Usage:
+    python benchmarks/bench_agents.py --threads 500 --latency 0.02
+    python benchmarks/bench_agents.py --agents basic --modes sequential,concurrent --json results.jsonl
+    python benchmarks/bench_agents.py --functions
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.oauth2.credentials import Credentials
+
+from fake_servers import start_in_process
+
+logger = logging.getLogger('bench')
+
+# 'planned' is the sequential mode with the inbound search settling reply checks first;
+# 'grouped' (AI agent only) writes --group-size follow-ups per OpenAI request
+MODES = ('sequential', 'batched', 'concurrent', 'planned', 'grouped')
+AGENTS = ('basic', 'openai')
+
+
+def server_request(url, path, method='GET'):
+    request = urllib.request.Request(url + path, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read() or b'{}')
+
+
+def write_token(directory):
+    """Write a long-lived fake OAuth token so the agents authenticate without a browser"""
+    path = os.path.join(directory, 'token.pickle')
+    creds = Credentials(token='bench-token', expiry=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+    with open(path, 'wb') as f:
+        pickle.dump(creds, f)
+    return path
+
+
+def make_agent(kind, url, token_path, args):
+    options = {
+        'token_path': token_path,
+        'gmail_api_endpoint': url,
+        'batch_uri': url + '/batch/gmail/v1',
+        'quota_units_per_sec': args.quota_units,
+        'sends_per_sec': args.sends_per_sec,
+    }
+
+    if kind == 'openai':
+        from openai_email_followup_agent import OpenAIEmailFollowupAgent
+        return OpenAIEmailFollowupAgent(use_ai=True, openai_api_key='bench', openai_base_url=url + '/v1', **options)
+
+    from email_followup_agent import EmailFollowupAgent
+    return EmailFollowupAgent(**options)
+
+
+def campaign_options(kind, mode, args):
+    options = {'days_ago': 30, 'dry_run': False}
+    if mode == 'batched':
+        options['batch_size'] = args.batch_size
+    elif mode == 'concurrent':
+        options['workers'] = args.workers
+        if kind == 'openai':
+            options['generation_workers'] = args.workers
+    elif mode == 'planned':
+        options['plan_replies'] = True
+    elif mode == 'grouped':
+        options['generation_group_size'] = args.group_size
+    return options
+
+
+def bench_campaign(kind, mode, url, token_path, args):
+    """Run one campaign and return its measurements"""
+    server_request(url, '/_reset', 'POST')
+    agent = make_agent(kind, url, token_path, args)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    summary = agent.run_followup_campaign(**campaign_options(kind, mode, args))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = server_request(url, '/_stats')
+    emails = summary['total_emails'] or 1
+    counters = {(c['name'], c['labels'].get('type')): c['value'] for c in agent.metrics.snapshot()['counters']}
+    openai_calls = stats.get('openai.chat', 0)
+    return {
+        'agent': kind,
+        'mode': mode,
+        'emails': summary['total_emails'],
+        'followups': summary['sent'],
+        'seconds': round(elapsed, 3),
+        'emails_per_sec': round(summary['total_emails'] / elapsed, 1),
+        'api_calls': stats.get('api_calls', 0),
+        'api_calls_per_email': round(stats.get('api_calls', 0) / emails, 2),
+        'http_batches': stats.get('http_batch', 0),
+        'openai_calls': openai_calls,
+        'prompt_tokens_per_call': round(counters.get(('openai_tokens_total', 'prompt'), 0) / (openai_calls or 1)),
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+        'stage_seconds': summary.get('stage_seconds', {}),
+    }
+
+
+def time_calls(func, items, repeat=1):
+    """Return per-call timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        for item in items:
+            started = time.perf_counter()
+            func(item)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def bench_functions(url, token_path, args):
+    """Time the individual agent methods on a sample of sent emails"""
+    basic = make_agent('basic', url, token_path, args)
+    ai = make_agent('openai', url, token_path, args)
+
+    sent = basic.find_sent_emails(days_ago=30)
+    sample = sent[:args.sample]
+    details = [basic.get_email_details(msg['id']) for msg in sample]
+    ai_details = [ai.get_email_details(msg['id']) for msg in sample]
+    for email in ai_details:
+        ai.load_email_body(email)
+
+    timings = {
+        'find_sent_emails': time_calls(lambda _: basic.find_sent_emails(days_ago=30), [None], args.repeat),
+        'check_for_reply': time_calls(lambda msg: basic.check_for_reply(msg['threadId'], msg['id']), sample,
+                                      args.repeat),
+        'get_email_details': time_calls(lambda msg: basic.get_email_details(msg['id']), sample, args.repeat),
+        'generate_ai_followup': time_calls(
+            lambda e: ai.generate_ai_followup(e['recipient_name'], e['subject'], e['body']), ai_details, args.repeat
+        ),
+        'send_followup': time_calls(
+            lambda d: basic.send_followup(d['to'], d['subject'], d['thread_id'], d['subject']), details, args.repeat
+        ),
+    }
+
+    results = []
+    for name, values in timings.items():
+        results.append({
+            'function': name,
+            'calls': len(values),
+            'mean_ms': round(statistics.mean(values), 2),
+            'p95_ms': round(sorted(values)[int(0.95 * (len(values) - 1))], 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the follow-up agents against a local fake server')
+    parser.add_argument('--threads', type=int, default=300, help='Threads in the fake mailbox')
+    parser.add_argument('--thread-depth', type=int, default=1, help='Messages we sent per thread')
+    parser.add_argument('--reply-rate', type=float, default=0.3, help='Share of threads with a reply')
+    parser.add_argument('--attachment-kb', type=int, default=0, help='Attachment size on each sent message')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each Gmail call')
+    parser.add_argument('--openai-latency', type=float, default=0.0, help='Seconds added to each completion')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fetches answered with 429')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--agents', default=','.join(AGENTS), help='Comma-separated: basic,openai')
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help='Comma-separated: sequential,batched,concurrent,planned,grouped')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--group-size', type=int, default=10, help='Follow-ups per OpenAI request in grouped mode')
+    # Defaults lift the real Gmail limits, so the numbers measure the agent rather than the throttle
+    parser.add_argument('--quota-units', type=float, default=1_000_000, help='Gmail quota units per second')
+    parser.add_argument('--sends-per-sec', type=float, default=1_000_000)
+    parser.add_argument('--functions', action='store_true', help='Time individual agent methods instead')
+    parser.add_argument('--sample', type=int, default=50, help='Emails per method in --functions mode')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', help='Append results to this JSON lines file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    logger.setLevel(logging.INFO)
+
+    url, server = start_in_process(
+        {'threads': args.threads, 'thread_depth': args.thread_depth, 'reply_rate': args.reply_rate,
+         'attachment_kb': args.attachment_kb, 'seed': args.seed},
+        {'latency': args.latency, 'openai_latency': args.openai_latency, 'error_rate': args.error_rate,
+         'seed': args.seed},
+    )
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        token_path = write_token(directory)
+
+        try:
+            if args.functions:
+                results = bench_functions(url, token_path, args)
+                logger.info(f"{'function':<22} {'calls':>6} {'mean ms':>9} {'p95 ms':>9}")
+                for r in results:
+                    logger.info(f"{r['function']:<22} {r['calls']:>6} {r['mean_ms']:>9} {r['p95_ms']:>9}")
+            else:
+                logger.info(f"{'agent':<8} {'mode':<11} {'emails':>7} {'emails/s':>9} {'calls/email':>12} "
+                            f"{'batches':>8} {'openai':>7} {'tok/call':>9} {'peak MB':>8} {'seconds':>8}")
+                for kind in args.agents.split(','):
+                    for mode in args.modes.split(','):
+                        if mode == 'grouped' and kind != 'openai':
+                            continue
+                        r = bench_campaign(kind, mode, url, token_path, args)
+                        results.append(r)
+                        logger.info(f"{r['agent']:<8} {r['mode']:<11} {r['emails']:>7} {r['emails_per_sec']:>9} "
+                                    f"{r['api_calls_per_email']:>12} {r['http_batches']:>8} {r['openai_calls']:>7} "
+                                    f"{r['prompt_tokens_per_call']:>9} "
+                                    f"{r['peak_memory_mb']:>8} {r['seconds']:>8}")
+        finally:
+            server.terminate()
+
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            for r in results:
+                f.write(json.dumps(dict(r, config=vars(args), timestamp=time.time())) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Body extraction benchmarks
+Compares mime_utils.extract_body_text with the previous top-level-only
+get_email_body on large HTML newsletters, HTML behind a large <style> block,
+long reply threads and messages with many attachments
+
+Usage:
+    python benchmarks/bench_mime.py [--repeat 20]
+"""
+
+import argparse
+import base64
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mime_utils import extract_body_text
+
+logger = logging.getLogger('bench')
+
+
+def encode(text):
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def legacy_get_email_body(message):
+    """The previous implementation: top-level parts only, uncompiled tag regex, then truncated"""
+    try:
+        if 'parts' in message['payload']:
+            for part in message['payload']['parts']:
+                if part['mimeType'] == 'text/plain':
+                    data = part['body'].get('data', '')
+                    if data:
+                        return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')[:1000]
+                elif part['mimeType'] == 'text/html':
+                    data = part['body'].get('data', '')
+                    if data:
+                        html = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                        return re.sub('<[^<]+?>', '', html)[:1000]
+        else:
+            data = message['payload']['body'].get('data', '')
+            if data:
+                return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')[:1000]
+    except Exception:
+        pass
+    return ""
+
+
+def newsletter(kb, rng):
+    """A table-heavy HTML newsletter with inline styles and entities"""
+    rows = []
+    size = 0
+    while size < kb * 1024:
+        row = (f'<tr><td style="padding:12px;font-family:Arial,sans-serif;color:#333">'
+               f'<h2>Story {len(rows)} &mdash; Market update</h2><p>Prices moved {rng.randint(1, 99)}% '
+               f'this week &amp; analysts say &quot;more to come&quot;.</p>'
+               f'<a href="https://example.com/{rng.getrandbits(64):x}">Read more&nbsp;&raquo;</a></td></tr>')
+        rows.append(row)
+        size += len(row)
+    html = ('<html><head><style>' + 'td{color:#333}' * 500 + '</style></head><body>'
+            '<table width="600">' + ''.join(rows) + '</table></body></html>')
+    return {'payload': {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/html', 'headers': [{'name': 'Content-Type', 'value': 'text/html; charset=UTF-8'}],
+             'body': {'data': encode(html)}},
+        ]},
+    ]}}
+
+
+def styled(kb):
+    """A short HTML email behind a large <style> block, as sent by some marketing tools"""
+    css = ''.join(f".c{i}{{color:#{i % 4096:03x};margin:{i % 20}px}}\n" for i in range(kb * 1024 // 30))
+    html = ('<html><head><style>' + css + '</style></head><body>'
+            '<p>Hi Sam,</p><p>Just checking whether you had a chance to look at the proposal.</p>'
+            '<p>Thanks,<br>Alex</p></body></html>')
+    return {'payload': {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/html', 'body': {'data': encode(html)}},
+        ]},
+    ]}}
+
+
+def reply_thread(depth):
+    """A plain-text reply quoting a long chain of earlier messages"""
+    text = "Thanks for getting back to me - Thursday at 2pm works well.\n\nBest,\nAlex\n\n"
+    for i in range(depth):
+        text += f"On Mon, Jan {i % 28 + 1}, 2024 at 10:00 AM Person {i} <p{i}@example.com> wrote:\n"
+        text += ''.join(f"> Line {j} of message {i}, with some quoted context.\n" for j in range(40))
+    return {'payload': {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': encode(text)}},
+            {'mimeType': 'text/html', 'body': {'data': encode('<div>' + text.replace('\n', '<br>') + '</div>')}},
+        ]},
+    ]}}
+
+
+def many_attachments(count, kb, rng):
+    """multipart/mixed with many inline attachments ahead of the nested body"""
+    parts = [{'mimeType': 'application/pdf', 'filename': f'file{i}.pdf',
+              'body': {'data': encode(rng.randbytes(kb * 1024)), 'size': kb * 1024}} for i in range(count)]
+    parts.append({'mimeType': 'multipart/alternative', 'parts': [
+        {'mimeType': 'text/plain', 'body': {'data': encode("Please find the documents attached.\n" * 20)}},
+        {'mimeType': 'text/html', 'body': {'data': encode("<p>Please find the documents attached.</p>" * 20)}},
+    ]})
+    return {'payload': {'mimeType': 'multipart/mixed', 'parts': parts}}
+
+
+def flattened(message):
+    """The same message with its text parts moved to the top level, where the legacy code looks"""
+    parts = []
+    stack = list(message['payload']['parts'])
+    while stack:
+        part = stack.pop(0)
+        if part['mimeType'].startswith('multipart/'):
+            stack[:0] = part['parts']
+        else:
+            parts.append(part)
+    return {'payload': {'mimeType': 'multipart/mixed', 'parts': parts}}
+
+
+def measure(func, message, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(message)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    func(message)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(timings), peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark email body extraction')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = {
+        'newsletter 2MB HTML': newsletter(2048, rng),
+        'HTML behind a 256KB <style>': styled(256),
+        'reply quoting 50 messages': reply_thread(50),
+        '40 attachments x 256KB': many_attachments(40, 256, rng),
+    }
+    # Flat copies show the cost of the legacy code on layouts it can read
+    cases.update({f"{case} (flat)": flattened(message) for case, message in list(cases.items())})
+    implementations = {
+        'legacy': legacy_get_email_body,
+        'mime_utils': lambda message: extract_body_text(message['payload']),
+    }
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger.info(f"{'case':<35} {'implementation':<12} {'median ms':>10} {'peak MB':>8} {'chars':>6}  preview")
+    for case, message in cases.items():
+        for name, func in implementations.items():
+            text, median_ms, peak_mb = measure(func, message, args.repeat)
+            preview = ' '.join(text.split())[:40]
+            logger.info(f"{case:<35} {name:<12} {median_ms:>10.2f} {peak_mb:>8.2f} {len(text):>6}  {preview!r}")
+
+
+if __name__ == "__main__":
+    main()
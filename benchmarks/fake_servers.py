@@ -0,0 +1,448 @@
+"""
+Local fake Gmail and OpenAI servers for benchmarks
+Serves a generated mailbox over the Gmail REST routes the agents use (plus the
+HTTP batch endpoint) and a canned OpenAI chat completions endpoint, with
+configurable latency and injected 429 responses
+"""
+
+import base64
+import email
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+OWN_ADDRESS = 'me@example.com'
+
+# Gmail only returns these keys for format=metadata
+METADATA_KEYS = ('id', 'threadId', 'labelIds', 'snippet', 'historyId', 'internalDate', 'sizeEstimate')
+
+BODY_TEXT = (
+    "Hi {name},\n\nI'm writing about the {role} role we discussed last week. I've attached my resume "
+    "and a short portfolio for your review.\n\nBest regards,\nAlex"
+)
+
+
+def encode_body(data):
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+class FakeMailbox:
+    """
+    Deterministic synthetic mailbox
+
+    Each thread starts with a message sent by us. Threads have `thread_depth`
+    messages (our earlier follow-ups), and a `reply_rate` share of them end
+    with a reply from the recipient. Sent messages can carry an attachment of
+    `attachment_kb` kilobytes, returned inline with the full format.
+    """
+
+    def __init__(self, threads=200, thread_depth=1, reply_rate=0.3, attachment_kb=0, seed=0):
+        self.rng = random.Random(seed)
+        self.messages = {}
+        self.threads = {}
+        self.history_id = 1000
+        self.sent = []
+        self.drafts = {}
+
+        attachment = encode_body(self.rng.randbytes(attachment_kb * 1024)) if attachment_kb else None
+
+        timestamp = 1_700_000_000_000
+        for t in range(threads):
+            thread_id = f"t{t:06d}"
+            name = f"Contact {t}"
+            recipient = f"{name} <contact{t}@example.org>"
+            subject = f"Application for position {t}"
+            replied = self.rng.random() < reply_rate
+
+            for depth in range(max(thread_depth, 2 if replied else 1)):
+                timestamp += self.rng.randint(1000, 60_000)
+                is_reply = replied and depth == max(thread_depth, 2) - 1
+                sender = recipient if is_reply else f"Me <{OWN_ADDRESS}>"
+                to = f"Me <{OWN_ADDRESS}>" if is_reply else recipient
+                # Like Gmail, a thread's ID is the ID of its first message
+                message_id = thread_id if depth == 0 else f"m{t:06d}{depth:02d}"
+                self.add_message(thread_id, message_id, timestamp, sender, to, subject,
+                                 BODY_TEXT.format(name=name, role=f"position {t}"),
+                                 None if is_reply else attachment, sent=not is_reply)
+
+    def add_message(self, thread_id, message_id, timestamp, sender, to, subject, text, attachment, sent):
+        headers = [
+            {'name': 'From', 'value': sender},
+            {'name': 'To', 'value': to},
+            {'name': 'Subject', 'value': subject if not self.threads.get(thread_id) else f"Re: {subject}"},
+            {'name': 'Message-ID', 'value': f"<{message_id}@example.com>"},
+        ]
+        text_part = {'mimeType': 'text/plain', 'headers': [], 'body': {'data': encode_body(text.encode())}}
+
+        if attachment:
+            payload = {'mimeType': 'multipart/mixed', 'headers': headers, 'body': {'size': 0}, 'parts': [
+                text_part,
+                {'mimeType': 'application/pdf', 'filename': 'resume.pdf', 'headers': [],
+                 'body': {'data': attachment, 'size': len(attachment)}},
+            ]}
+        else:
+            payload = dict(text_part, headers=headers)
+
+        self.history_id += 1
+        message = {
+            'id': message_id,
+            'threadId': thread_id,
+            'labelIds': ['SENT'] if sent else ['INBOX', 'UNREAD'],
+            'snippet': text[:100],
+            'historyId': str(self.history_id),
+            'internalDate': str(timestamp),
+            'sizeEstimate': len(json.dumps(payload)),
+            'payload': payload,
+        }
+        self.messages[message_id] = message
+        self.threads.setdefault(thread_id, []).append(message)
+        return message
+
+    def clear_sent(self):
+        """Remove every message sent through the server, restoring the generated mailbox"""
+        for body in self.sent:
+            message = self.messages.pop(body['id'], None)
+            if message:
+                self.threads[message['threadId']].remove(message)
+                if not self.threads[message['threadId']]:
+                    del self.threads[message['threadId']]
+        self.sent.clear()
+        self.drafts.clear()
+
+    @property
+    def sent_count(self):
+        return sum(1 for m in self.messages.values() if 'SENT' in m['labelIds'])
+
+
+def metadata_view(message, headers=None):
+    """Return the metadata-format view of a message, optionally filtered to some headers"""
+    view = {k: message[k] for k in METADATA_KEYS if k in message}
+    wanted = {h.lower() for h in headers} if headers else None
+    view['payload'] = {
+        'mimeType': message['payload']['mimeType'],
+        'headers': [h for h in message['payload']['headers'] if wanted is None or h['name'].lower() in wanted],
+    }
+    return view
+
+
+class FakeServer:
+    """
+    Fake Gmail REST API and OpenAI endpoint on a local port
+
+    Args:
+        mailbox: FakeMailbox to serve
+        latency: Seconds added to every Gmail request
+        openai_latency: Seconds added to every chat completion
+        error_rate: Share of threads.get / messages.get calls answered with 429
+        seed: Seed for the 429 injection, so runs are reproducible
+    """
+
+    def __init__(self, mailbox, latency=0.0, openai_latency=0.0, error_rate=0.0, seed=0):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.openai_latency = openai_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        handler = type('Handler', (FakeRequestHandler,), {'fake': self})
+        self.httpd = FakeHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def inject_error(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    @property
+    def api_calls(self):
+        """Gmail API calls served, counting each call inside a batch"""
+        return sum(n for name, n in self.calls.items() if name not in ('http_batch', 'openai.chat'))
+
+    def route(self, method, path, body=b''):
+        """Return (status, JSON object) for one Gmail or OpenAI request"""
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        path = url.path
+        mailbox = self.mailbox
+
+        if path == '/_stats':
+            with self.lock:
+                return 200, dict(self.calls, api_calls=self.api_calls, sent=len(mailbox.sent))
+        if path == '/_reset':
+            with self.lock:
+                self.calls.clear()
+                mailbox.clear_sent()
+            return 200, {}
+
+        if path.endswith('/chat/completions'):
+            return self.chat_completion(json.loads(body or b'{}'))
+
+        time.sleep(self.latency)
+
+        if method == 'GET' and path.endswith('/users/me/messages'):
+            self.count('messages.list')
+            return 200, self.list_messages(query)
+
+        match = re.match(r'.*/users/me/messages/([^/]+)$', path)
+        if method == 'GET' and match:
+            self.count('messages.get')
+            if self.inject_error():
+                return 429, rate_limit_error()
+            message = mailbox.messages.get(match.group(1))
+            if not message:
+                return 404, not_found()
+            if query.get('format', ['full'])[0] == 'metadata':
+                return 200, metadata_view(message, query.get('metadataHeaders'))
+            return 200, message
+
+        match = re.match(r'.*/users/me/threads/([^/]+)$', path)
+        if method == 'GET' and match:
+            self.count('threads.get')
+            if self.inject_error():
+                return 429, rate_limit_error()
+            messages = mailbox.threads.get(match.group(1))
+            if not messages:
+                return 404, not_found()
+            if query.get('format', ['full'])[0] == 'metadata':
+                messages = [metadata_view(m, query.get('metadataHeaders')) for m in messages]
+            return 200, {'id': match.group(1), 'historyId': messages[-1]['historyId'], 'messages': messages}
+
+        if path.endswith('/users/me/profile'):
+            self.count('getProfile')
+            return 200, {'emailAddress': OWN_ADDRESS, 'historyId': str(mailbox.history_id),
+                         'messagesTotal': len(mailbox.messages)}
+
+        if path.endswith('/settings/sendAs'):
+            self.count('sendAs.list')
+            return 200, {'sendAs': [{'sendAsEmail': OWN_ADDRESS, 'isPrimary': True}]}
+
+        if path.endswith('/users/me/history'):
+            self.count('history.list')
+            return 200, {'history': [], 'historyId': str(mailbox.history_id)}
+
+        if method == 'POST' and path.endswith('/users/me/messages/send'):
+            self.count('messages.send')
+            return 200, self.send_message(json.loads(body or b'{}'))
+
+        if method == 'POST' and path.endswith('/users/me/drafts/send'):
+            self.count('drafts.send')
+            with self.lock:
+                draft = mailbox.drafts.pop(json.loads(body or b'{}').get('id'), None)
+            if not draft:
+                return 404, not_found()
+            return 200, self.send_message(draft['message'])
+
+        if method == 'POST' and path.endswith('/users/me/drafts'):
+            self.count('drafts.create')
+            message = json.loads(body or b'{}')['message']
+            with self.lock:
+                draft_id = f"r{self.calls['drafts.create']:06d}"
+                mailbox.drafts[draft_id] = {'id': draft_id, 'message': message}
+            return 200, {'id': draft_id, 'message': {'id': f"dm{draft_id}", 'threadId': message.get('threadId'),
+                                                     'labelIds': ['DRAFT']}}
+
+        if method == 'GET' and path.endswith('/users/me/drafts'):
+            self.count('drafts.list')
+            with self.lock:
+                ids = sorted(mailbox.drafts)
+            start = int(query.get('pageToken', ['0'])[0])
+            size = int(query.get('maxResults', ['100'])[0])
+            response = {'drafts': [{'id': i, 'message': {'id': f"dm{i}"}} for i in ids[start:start + size]],
+                        'resultSizeEstimate': len(ids)}
+            if start + size < len(ids):
+                response['nextPageToken'] = str(start + size)
+            return 200, response
+
+        match = re.match(r'.*/users/me/drafts/([^/]+)$', path)
+        if method == 'DELETE' and match:
+            self.count('drafts.delete')
+            with self.lock:
+                mailbox.drafts.pop(match.group(1), None)
+            return 204, {}
+
+        return 404, not_found()
+
+    def send_message(self, body):
+        """Store a sent message, adding it to its thread like Gmail does"""
+        with self.lock:
+            message_id = f"sent{len(self.mailbox.sent):06d}"
+            self.mailbox.sent.append(dict(body, id=message_id))
+            thread_id = body.get('threadId') or message_id
+            if thread_id in self.mailbox.threads:
+                subject = self.mailbox.threads[thread_id][0]['payload']['headers'][2]['value']
+            else:
+                subject = ''
+            self.mailbox.add_message(thread_id, message_id, int(time.time() * 1000), f"Me <{OWN_ADDRESS}>", '',
+                                     subject, 'follow-up', None, sent=True)
+        return {'id': message_id, 'threadId': thread_id, 'labelIds': ['SENT']}
+
+    def list_messages(self, query):
+        # Only the sent / not-sent part of the search query is modelled
+        inbound = '-in:sent' in query.get('q', [''])[0]
+        ids = sorted((m['id'] for m in self.mailbox.messages.values() if ('SENT' in m['labelIds']) != inbound),
+                     key=lambda i: int(self.mailbox.messages[i]['internalDate']), reverse=True)
+        start = int(query.get('pageToken', ['0'])[0])
+        size = min(int(query.get('maxResults', ['100'])[0]), 500)
+
+        response = {'messages': [{'id': i, 'threadId': self.mailbox.messages[i]['threadId']}
+                                 for i in ids[start:start + size]],
+                    'resultSizeEstimate': len(ids)}
+        if start + size < len(ids):
+            response['nextPageToken'] = str(start + size)
+        return response
+
+    def chat_completion(self, request):
+        self.count('openai.chat')
+        time.sleep(self.openai_latency)
+        prompt = ' '.join(m.get('content', '') for m in request.get('messages', []))
+        content = "Hi,\n\nI wanted to follow up on my previous email. Would you have time for a quick chat?"
+        if request.get('response_format', {}).get('type') == 'json_schema':
+            # Grouped request: one body per "id:" entry, greeting that entry's first name
+            followups = []
+            for line in request['messages'][-1]['content'].splitlines():
+                if line.startswith('id: '):
+                    followups.append({'id': line[4:], 'body': content})
+                elif line.startswith('First name: ') and followups and line[12:] != 'unknown':
+                    followups[-1]['body'] = content.replace('Hi,', f"Hi {line[12:]},")
+            content = json.dumps({'followups': followups})
+        return 200, {
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': 0,
+            'model': request.get('model', 'gpt-4o'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                      'total_tokens': (len(prompt) + len(content)) // 4},
+        }
+
+
+def rate_limit_error():
+    return {'error': {'code': 429, 'message': 'Rate limit exceeded',
+                      'errors': [{'reason': 'rateLimitExceeded', 'domain': 'usageLimits'}]}}
+
+
+def not_found():
+    return {'error': {'code': 404, 'message': 'Not Found'}}
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    # Concurrent benchmarks open many connections at once
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, obj, content_type='application/json', headers=None):
+        data = obj if isinstance(obj, bytes) else json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def respond(self, status, obj):
+        headers = {'Retry-After': '0.05'} if status == 429 else None
+        self.send_json(status, obj, headers=headers)
+
+    def do_GET(self):
+        self.respond(*self.fake.route('GET', self.path))
+
+    def do_DELETE(self):
+        self.respond(*self.fake.route('DELETE', self.path))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/batch'):
+            self.handle_batch(body)
+        else:
+            self.respond(*self.fake.route('POST', self.path, body))
+
+    def handle_batch(self, body):
+        """Answer a multipart/mixed Gmail batch request, one part per call"""
+        self.fake.count('http_batch')
+        container = email.message_from_bytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body
+        )
+        boundary = 'batch_response'
+        parts = []
+
+        for part in container.get_payload():
+            content_id = part['Content-ID'].strip('<>')
+            inner = part.get_payload()
+            request_line, _, rest = inner.partition('\n')
+            method, path, _ = request_line.strip().split(' ')
+            sections = re.split(r'\r?\n\r?\n', rest, maxsplit=1)
+            inner_body = sections[1].encode() if len(sections) > 1 else b''
+            status, obj = self.fake.route(method, path, inner_body)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(obj)}\r\n"
+            )
+
+        data = (''.join(parts) + f"--{boundary}--\r\n").encode()
+        self.send_json(200, data, f"multipart/mixed; boundary={boundary}")
+
+
+def serve_forever(url_queue, mailbox_options, server_options):
+    """Child process entry point: build the mailbox, start the server and report its URL"""
+    server = FakeServer(FakeMailbox(**mailbox_options), **server_options).start()
+    url_queue.put(server.url)
+    threading.Event().wait()
+
+
+def start_in_process(mailbox_options=None, server_options=None):
+    """
+    Run a FakeServer in a child process, so its memory and CPU stay out of measurements
+
+    Call counts are read from GET /_stats and cleared with POST /_reset.
+
+    Returns:
+        Tuple of (base URL, process)
+    """
+    import multiprocessing
+
+    url_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_forever, args=(url_queue, mailbox_options or {},
+                                                                  server_options or {}), daemon=True)
+    process.start()
+    return url_queue.get(timeout=60), process
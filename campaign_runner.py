@@ -0,0 +1,266 @@
+"""
+Multi-Mailbox Campaign Runner
+Runs the follow-up campaign for every account in a config file, one process
+per mailbox, and combines the results into a single report
+
+Usage:
+    python campaign_runner.py accounts.json [--processes 4] [--report report.json] [--send-drafts]
+
+Each account needs a valid token file; run the agent once per mailbox
+interactively to create it, since worker processes cannot open a browser.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from collections import deque
+from queue import Empty
+
+logger = logging.getLogger(__name__)
+
+# Settings passed to the agent constructor; everything else goes to run_followup_campaign
+AGENT_OPTIONS = {
+    'basic': {'batch_uri', 'quota_units_per_sec', 'sends_per_sec', 'token_path', 'credentials_path',
+              'gmail_api_endpoint', 'metrics_path', 'templates_dir'},
+    'openai': {'use_ai', 'batch_uri', 'quota_units_per_sec', 'sends_per_sec', 'generation_cache',
+               'tokens_per_minute', 'openai_api_key', 'openai_base_url', 'token_path', 'credentials_path',
+               'gmail_api_endpoint', 'metrics_path', 'templates_dir'},
+}
+
+CAMPAIGN_OPTIONS = {
+    'basic': {'days_ago', 'subject_keywords', 'dry_run', 'batch_size', 'state_db', 'workers', 'outbox',
+              'campaign_id', 'skip_replied_recipients', 'max_followups_per_recipient', 'followup_window_days',
+              'plan_replies', 'drafts'},
+    'openai': {'days_ago', 'subject_keywords', 'dry_run', 'show_previews', 'batch_size', 'state_db', 'workers',
+               'generation_workers', 'batch_api', 'outbox', 'campaign_id', 'skip_replied_recipients',
+               'max_followups_per_recipient', 'followup_window_days', 'plan_replies', 'generation_group_size',
+               'drafts'},
+}
+
+DEFAULT_TIMEOUT_SECONDS = 3600
+DEFAULT_LOG_DIR = 'campaign_logs'
+
+
+def load_accounts(config_path):
+    """
+    Read the config file and merge each account with the shared defaults
+
+    The config looks like:
+        {
+          "defaults": {"agent": "basic", "days_ago": 14, "dry_run": true},
+          "accounts": [
+            {"name": "sales", "token_path": "tokens/sales.pickle"},
+            {"name": "support", "token_path": "tokens/support.pickle", "agent": "openai"}
+          ]
+        }
+    """
+    with open(config_path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    defaults = config.get('defaults', {})
+    accounts = []
+    names = set()
+
+    for entry in config.get('accounts', []):
+        account = {**defaults, **entry}
+        name = account.get('name')
+
+        if not name:
+            raise ValueError(f"Account without a name in {config_path}: {entry}")
+        if name in names:
+            raise ValueError(f"Duplicate account name in {config_path}: {name}")
+        if account.setdefault('agent', 'basic') not in AGENT_OPTIONS:
+            raise ValueError(f"Unknown agent type for {name}: {account['agent']}")
+
+        unknown = set(account) - AGENT_OPTIONS[account['agent']] - CAMPAIGN_OPTIONS[account['agent']] \
+            - {'name', 'agent', 'timeout'}
+        if unknown:
+            raise ValueError(f"Unknown settings for {name}: {', '.join(sorted(unknown))}")
+
+        names.add(name)
+        accounts.append(account)
+
+    return accounts
+
+
+def build_agent(account):
+    """Create the agent for one account"""
+    kind = account['agent']
+    options = {k: v for k, v in account.items() if k in AGENT_OPTIONS[kind]}
+
+    if kind == 'openai':
+        from openai_email_followup_agent import OpenAIEmailFollowupAgent
+        return OpenAIEmailFollowupAgent(**options)
+
+    from email_followup_agent import EmailFollowupAgent
+    return EmailFollowupAgent(**options)
+
+
+def run_account(account, log_dir, results, send_drafts=False):
+    """
+    Worker process entry point: run one account's campaign and report the outcome
+
+    With send_drafts, send the account's approved drafts (see the drafts
+    setting) instead of running a campaign.
+    """
+    started = time.monotonic()
+    log_path = os.path.join(log_dir, f"{account['name']}.log")
+    result = {'name': account['name'], 'status': 'ok', 'log': log_path}
+
+    with open(log_path, 'w', encoding='utf-8') as log:
+        # Send this process's agent output to the account's own log file
+        logging.basicConfig(stream=log, level=logging.INFO, format='%(message)s', force=True)
+        try:
+            agent = build_agent(account)
+            if send_drafts:
+                result['summary'] = agent.send_approved_drafts(account['drafts'], account.get('campaign_id'))
+            else:
+                options = {k: v for k, v in account.items() if k in CAMPAIGN_OPTIONS[account['agent']]}
+                result['summary'] = agent.run_followup_campaign(**options)
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = f"{type(e).__name__}: {e}"
+            logger.error(traceback.format_exc())
+        logging.shutdown()
+
+    result['seconds'] = round(time.monotonic() - started, 2)
+    results.put(result)
+
+
+def run_accounts(accounts, processes=None, log_dir=DEFAULT_LOG_DIR, default_timeout=DEFAULT_TIMEOUT_SECONDS,
+                 send_drafts=False):
+    """
+    Run every account's campaign, at most `processes` mailboxes at a time
+
+    Each mailbox gets its own process, so a crash only loses that account and
+    a mailbox that runs past its timeout is terminated while the others continue.
+
+    Returns:
+        List of per-account results in config order
+    """
+    processes = processes or os.cpu_count() or 1
+    os.makedirs(log_dir, exist_ok=True)
+
+    results = multiprocessing.Queue()
+    pending = deque(accounts)
+    running = {}
+    finished = {}
+
+    while pending or running:
+        # Start accounts while there are free slots
+        while pending and len(running) < processes:
+            account = pending.popleft()
+            process = multiprocessing.Process(target=run_account, args=(account, log_dir, results, send_drafts),
+                                              name=f"campaign-{account['name']}", daemon=True)
+            process.start()
+            deadline = time.monotonic() + account.get('timeout', default_timeout)
+            running[account['name']] = (process, deadline)
+            logger.info(f"▶️  Started {account['name']}")
+
+        # Collect whatever finished, waiting briefly so the loop doesn't spin
+        try:
+            result = results.get(timeout=0.5)
+            finished[result['name']] = result
+            icon = '✓' if result['status'] == 'ok' else '❌'
+            logger.info(f"{icon} Finished {result['name']} in {result['seconds']}s")
+        except Empty:
+            pass
+
+        now = time.monotonic()
+        for name, (process, deadline) in list(running.items()):
+            if name in finished:
+                process.join()
+                del running[name]
+            elif now > deadline:
+                process.terminate()
+                process.join()
+                del running[name]
+                finished[name] = {'name': name, 'status': 'timeout', 'log': os.path.join(log_dir, f"{name}.log")}
+                logger.info(f"⏱️  Stopped {name}: timed out")
+            elif not process.is_alive() and process.exitcode != 0:
+                del running[name]
+                finished[name] = {'name': name, 'status': 'error', 'error': f"process exited with {process.exitcode}",
+                                  'log': os.path.join(log_dir, f"{name}.log")}
+                logger.error(f"❌ {name} crashed (exit code {process.exitcode})")
+
+    return [finished[account['name']] for account in accounts]
+
+
+def build_report(results, seconds):
+    """Aggregate per-account results into one report"""
+    totals = {'total_emails': 0, 'already_replied': 0, 'needs_followup': 0, 'skipped_recipients': 0, 'drafted': 0,
+              'sent': 0, 'discarded': 0, 'failed': 0}
+
+    for result in results:
+        for key in totals:
+            totals[key] += (result.get('summary') or {}).get(key, 0)
+
+    return {
+        'accounts': results,
+        'totals': totals,
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': [r['name'] for r in results if r['status'] != 'ok'],
+        'seconds': round(seconds, 2),
+    }
+
+
+def print_report(report):
+    logger.info("\n" + "="*70)
+    logger.info("📊 CAMPAIGN REPORT")
+    logger.info("="*70)
+
+    for result in report['accounts']:
+        summary = result.get('summary') or {}
+        if result['status'] == 'ok':
+            logger.info(f"✓ {result['name']}: {summary.get('total_emails', 0)} analyzed, "
+                        f"{summary.get('needs_followup', 0)} need follow-up, {summary.get('drafted', 0)} drafted, "
+                        f"{summary.get('sent', 0)} sent")
+        else:
+            logger.error(f"❌ {result['name']}: {result['status']} {result.get('error', '')} (see {result['log']})")
+
+    totals = report['totals']
+    logger.info("="*70)
+    logger.info(f"Accounts: {report['succeeded']}/{len(report['accounts'])} succeeded in {report['seconds']}s")
+    logger.info(f"Total: {totals['total_emails']} | Replied: {totals['already_replied']} | "
+                f"Need follow-up: {totals['needs_followup']} | Drafted: {totals['drafted']} | Sent: {totals['sent']} | "
+                f"Failed: {totals['failed']}")
+    logger.info("="*70)
+
+
+def main():
+    """Main execution function"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Run follow-up campaigns for several mailboxes')
+    parser.add_argument('config', help='JSON file listing the accounts and their settings')
+    parser.add_argument('--processes', type=int, default=None, help='Mailboxes to run at once (default: CPU count)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS, help='Seconds allowed per mailbox')
+    parser.add_argument('--log-dir', default=DEFAULT_LOG_DIR, help='Directory for per-account output')
+    parser.add_argument('--report', help='Also write the report to this JSON file')
+    parser.add_argument('--send-drafts', action='store_true',
+                        help="Send the approved drafts of accounts with a drafts store instead of running campaigns")
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.config)
+    if args.send_drafts:
+        accounts = [account for account in accounts if account.get('drafts')]
+        logger.info(f"📧 Sending approved drafts for {len(accounts)} mailboxes...\n")
+    else:
+        logger.info(f"📧 Running {len(accounts)} mailbox campaigns...\n")
+
+    started = time.monotonic()
+    results = run_accounts(accounts, args.processes, args.log_dir, args.timeout, args.send_drafts)
+    report = build_report(results, time.monotonic() - started)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"\n💾 Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
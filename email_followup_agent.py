@@ -6,159 +6,149 @@ Sends follow-ups in the same email thread
 For AI-powered personalization, use openai_email_followup_agent.py instead.
 """
 
-import os
-import base64
-import time
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-import pickle
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-# Gmail API scopes
-SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+from gmail_campaign import GmailCampaignMixin
+from gmail_client import (
+    chunked, execute_batched, header_dict, TokenBucket, DEFAULT_BATCH_SIZE, DEFAULT_SENDS_PER_SECOND,
+    FETCH_PROFILES, GMAIL_QUOTA_UNITS_PER_SECOND
+)
+from message_builder import build_message
+from metrics import Metrics
+from recipients import display_name, parse_recipients, thread_activity, FOLLOWUP_WINDOW_DAYS
+from state_store import Outbox
+from template_engine import load_templates, TEMPLATES_DIR
 
+logger = logging.getLogger(__name__)
 
-class EmailFollowupAgent:
-    def __init__(self):
+
+class EmailFollowupAgent(GmailCampaignMixin):
+    def __init__(self, batch_uri=None, quota_units_per_sec=GMAIL_QUOTA_UNITS_PER_SECOND,
+                 sends_per_sec=DEFAULT_SENDS_PER_SECOND, token_path='token.pickle',
+                 credentials_path='credentials.json', gmail_api_endpoint=None, metrics_path=None,
+                 templates_dir=TEMPLATES_DIR):
+        """
+        Args:
+            batch_uri: Batch endpoint override for batched analysis (optional)
+            quota_units_per_sec: Gmail quota units per second the agent may use
+            sends_per_sec: Maximum follow-up sends per second
+            token_path: Pickled OAuth token for the mailbox
+            credentials_path: OAuth client secrets used when no valid token exists
+            gmail_api_endpoint: Gmail API root override, e.g. a local fake server (optional)
+            metrics_path: File the run's metrics are written to; .prom for Prometheus text,
+                anything else for JSON lines (optional)
+            templates_dir: Directory of follow-up templates (default: templates/)
+        """
         self.service = None
+        self.session = None
+        self.gmail = None
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.gmail_api_endpoint = gmail_api_endpoint
+        self.metrics = Metrics()
+        self.metrics_path = metrics_path
+        self.quota_units_per_sec = quota_units_per_sec
+        self.send_limiter = TokenBucket(sends_per_sec, capacity=1)
+        self.batch_uri = batch_uri
+        self.state_store = None
+        self.changed_threads = None
+        self.outbox = None
+        self.draft_store = None
+        self.own_addresses = None
+        self.recipient_index = None
+        self.recipient_policy = {}
+        self.planned_replies = 0
+        self.templates = load_templates(templates_dir, signoff='Best regards')
         self.authenticate()
     
-    def authenticate(self):
-        """Authenticate with Gmail API"""
-        creds = None
-        
-        # Token file stores the user's access and refresh tokens
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
-        
-        # If there are no valid credentials, let the user log in
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-        
-        self.service = build('gmail', 'v1', credentials=creds)
-        print("✓ Successfully authenticated with Gmail")
-    
-    def find_sent_emails(self, days_ago=7, subject_keywords=None):
+    def analyze_thread(self, thread, original_msg_id):
         """
-        Find emails you sent in the last N days
+        Extract email details and reply status from a single fetched thread
         
-        Args:
-            days_ago: How many days back to search (default: 7)
-            subject_keywords: List of keywords to filter subjects (optional)
-        """
-        print(f"\n🔍 Searching for emails sent in the last {days_ago} days...")
+        The thread already contains the original message, so no separate
+        messages.get call is needed.
         
-        # Calculate the date for the query
-        date_filter = (datetime.now() - timedelta(days=days_ago)).strftime('%Y/%m/%d')
+        Returns:
+            Tuple of (details, has_reply); details is None if the message is missing
+        """
+        original = next((msg for msg in thread.get('messages', []) if msg['id'] == original_msg_id), None)
+        if not original:
+            return None, False
         
-        # Build query
-        query = f'in:sent after:{date_filter}'
+        details = self.parse_email_details(original)
+        has_reply = self.thread_has_reply(thread, original_msg_id)
         
-        if subject_keywords:
-            keyword_query = ' OR '.join([f'subject:{kw}' for kw in subject_keywords])
-            query += f' ({keyword_query})'
+        # Stored with the details so later runs can index the thread without fetching it
+        details['repliers'], details['followup_times'] = thread_activity(thread, self.get_own_addresses())
+        if self.recipient_index is not None:
+            self.recipient_index.add_details(details, has_reply)
         
-        try:
-            results = self.service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=500
-            ).execute()
-            
-            messages = results.get('messages', [])
-            print(f"✓ Found {len(messages)} sent emails")
-            return messages
+        if self.state_store is not None:
+            self.state_store.save_thread(thread['id'], original_msg_id, thread.get('historyId'), has_reply, details)
         
-        except Exception as e:
-            print(f"❌ Error finding sent emails: {e}")
-            return []
+        return details, has_reply
     
-    def check_for_reply(self, thread_id, original_msg_id):
-        """
-        Check if a thread has replies after the original message
-        
-        Args:
-            thread_id: Gmail thread ID
-            original_msg_id: The ID of your original sent message
-        """
+    def check_thread(self, thread_id, original_msg_id):
+        """Fetch a thread once and return (details, has_reply) for the original message"""
         try:
-            thread = self.service.users().threads().get(
+            thread = self.gmail.execute(self.service.users().threads().get(
                 userId='me',
-                id=thread_id
-            ).execute()
-            
-            messages = thread.get('messages', [])
-            
-            # Find the original message timestamp
-            original_timestamp = None
-            for msg in messages:
-                if msg['id'] == original_msg_id:
-                    original_timestamp = int(msg['internalDate'])
-                    break
-            
-            if not original_timestamp:
-                return False
-            
-            # Check if there are any messages after the original
-            for msg in messages:
-                msg_timestamp = int(msg['internalDate'])
-                # If message is after original and not from us
-                if msg_timestamp > original_timestamp:
-                    headers = msg['payload']['headers']
-                    from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), '')
-                    
-                    # Check if it's not from us (they replied)
-                    if 'me' not in from_header.lower():
-                        return True
+                id=thread_id,
+                **FETCH_PROFILES['metadata']
+            ))
             
-            return False
+            return self.analyze_thread(thread, original_msg_id)
         
         except Exception as e:
-            print(f"❌ Error checking for reply: {e}")
-            return False
+            logger.error(f"❌ Error checking thread: {e}")
+            self.metrics.inc('analysis_errors_total', stage='thread')
+            return None, False
     
     def get_email_details(self, message_id):
         """Get details of an email message"""
         try:
-            message = self.service.users().messages().get(
+            message = self.gmail.execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
-                format='full'
-            ).execute()
-            
-            headers = message['payload']['headers']
-            
-            # Extract relevant headers
-            subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-            to = next((h['value'] for h in headers if h['name'].lower() == 'to'), '')
-            thread_id = message['threadId']
+                **FETCH_PROFILES['metadata']
+            ))
             
-            return {
-                'id': message_id,
-                'thread_id': thread_id,
-                'subject': subject,
-                'to': to,
-                'snippet': message.get('snippet', ''),
-            }
+            return self.parse_email_details(message)
         
         except Exception as e:
-            print(f"❌ Error getting email details: {e}")
+            logger.error(f"❌ Error getting email details: {e}")
+            self.metrics.inc('analysis_errors_total', stage='message')
             return None
     
-    def create_followup_message(self, to, subject, thread_id, original_subject, recipient_name=None):
+    def parse_email_details(self, message):
+        """Extract the details we need from a fetched message resource"""
+        headers = header_dict(message['payload'])
+        
+        # Extract relevant headers
+        subject = headers.get('subject', 'No Subject')
+        to = headers.get('to', '')
+        thread_id = message['threadId']
+        
+        # Every To/Cc address, normalized, for the recipient index
+        recipients = parse_recipients(to, headers.get('cc', ''))
+        
+        return {
+            'id': message['id'],
+            'thread_id': thread_id,
+            'subject': subject,
+            'to': to,
+            'recipient_name': display_name(*recipients[0]) if recipients else None,
+            # Threading headers for the follow-up
+            'message_id': headers.get('message-id'),
+            'references': headers.get('references'),
+            'recipients': [address for _, address in recipients],
+            'snippet': message.get('snippet', ''),
+        }
+    
+    def create_followup_message(self, to, subject, thread_id, original_subject, recipient_name=None, body=None,
+                                message_id=None, references=None):
         """
         Create a follow-up email message
         
@@ -168,141 +158,372 @@ class EmailFollowupAgent:
             thread_id: Gmail thread ID to continue the conversation
             original_subject: Original email subject for reference
             recipient_name: Name of recipient (optional)
+            body: Follow-up text; rendered from the templates if not given
+            message_id: Message-ID of the original, for In-Reply-To/References (optional)
+            references: References header of the original (optional)
         """
-        # Personalize greeting
-        greeting = f"Hi {recipient_name}," if recipient_name else "Hi,"
-        
-        # Follow-up email body
-        body = f"""{greeting}
-
-I wanted to follow up on my previous email regarding {original_subject.replace('Re: ', '').replace('Fwd: ', '')}.
-
-I understand you're likely busy, but I wanted to reach out again as I'm very interested in exploring potential opportunities with your organization.
-
-Could you spare a few minutes to discuss this further? I'm happy to work around your schedule.
-
-Looking forward to hearing from you.
-
-Best regards"""
-
-        message = MIMEText(body)
-        message['to'] = to
-        message['subject'] = subject if subject.startswith('Re:') else f'Re: {subject}'
-        
-        # Encode the message
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        if body is None:
+            body = self.templates.render(recipient_name, original_subject)
         
-        return {
-            'raw': raw_message,
-            'threadId': thread_id
-        }
+        return build_message(to, subject, body, thread_id, message_id, references)
     
-    def send_followup(self, to, subject, thread_id, original_subject):
+    def send_followup(self, to, subject, thread_id, original_subject, recipient_name=None, body=None,
+                      message_id=None, references=None):
         """Send a follow-up email in the same thread"""
         try:
             # Create the follow-up message
-            message = self.create_followup_message(to, subject, thread_id, original_subject)
+            message = self.create_followup_message(to, subject, thread_id, original_subject, recipient_name, body,
+                                                   message_id, references)
             
             # Send the message
-            sent_message = self.service.users().messages().send(
+            sent_message = self.gmail.execute(self.service.users().messages().send(
                 userId='me',
                 body=message
-            ).execute()
+            ))
             
-            print(f"  ✓ Sent follow-up to {to}")
+            logger.info(f"  ✓ Sent follow-up to {to}")
             return True
         
         except Exception as e:
-            print(f"  ❌ Failed to send follow-up to {to}: {e}")
+            logger.error(f"  ❌ Failed to send follow-up to {to}: {e}")
             return False
     
-    def run_followup_campaign(self, days_ago=7, subject_keywords=None, dry_run=True):
+    def analyze_message(self, msg):
+        """Return (details, has_reply) for a message stub, from the state store or one thread fetch"""
+        stored = self.get_stored_result(msg)
+        if stored:
+            return stored
+        if msg.get('reply_plan') is False:
+            # The search already ruled out a reply - the message alone has the details
+            return self.get_email_details(msg['id']), False
+        return self.check_thread(msg['threadId'], msg['id'])
+    
+    def analyze_emails(self, sent_messages):
         """
-        Main function to run the follow-up campaign
+        Check each sent email for replies, one API call at a time
         
         Args:
-            days_ago: How many days back to search for sent emails
-            subject_keywords: Filter emails by subject keywords
-            dry_run: If True, only show what would be sent without actually sending
+            sent_messages: Any iterable of message stubs, e.g. from iter_sent_emails
+        
+        Returns:
+            Tuple of (needs_followup, already_replied, total_emails)
         """
-        print("="*60)
-        print("📧 EMAIL FOLLOW-UP AGENT")
-        print("="*60)
+        total_emails = 0
+        needs_followup = []
+        already_replied = []
         
-        # Find sent emails
-        sent_messages = self.find_sent_emails(days_ago, subject_keywords)
+        for idx, msg in enumerate(sent_messages, 1):
+            total_emails = idx
+            details, has_reply = self.analyze_message(msg)
+            
+            if not details:
+                continue
+            
+            logger.info(f"[{idx}] Checking: {details['to'][:50]}...")
+            
+            if has_reply:
+                already_replied.append(details)
+                logger.info(f"  ✓ Already replied - skipping")
+            else:
+                needs_followup.append(details)
+                logger.info(f"  ⚠️  No reply - needs follow-up")
         
-        if not sent_messages:
-            print("\n⚠️  No sent emails found matching your criteria")
-            return
+        return needs_followup, already_replied, total_emails
+    
+    def analyze_emails_batched(self, sent_messages, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Check sent emails for replies using Gmail HTTP batch requests
         
-        # Track statistics
-        total_emails = len(sent_messages)
+        Each thread is fetched once and the message details are read from it,
+        so every batch of emails costs a single HTTP round-trip. Batches are
+        sent as soon as enough stubs have been streamed in.
+        
+        Args:
+            sent_messages: Any iterable of message stubs, e.g. from iter_sent_emails
+            batch_size: Number of API calls per batch request
+        
+        Returns:
+            Tuple of (needs_followup, already_replied, total_emails)
+        """
+        total_emails = 0
         needs_followup = []
         already_replied = []
         
-        print(f"\n📊 Analyzing {total_emails} emails for replies...\n")
+        threads_api = self.service.users().threads()
+        messages_api = self.service.users().messages()
         
-        # Check each email for replies
-        for idx, msg in enumerate(sent_messages, 1):
-            msg_id = msg['id']
-            details = self.get_email_details(msg_id)
+        def fetch_request(msg):
+            if msg.get('reply_plan') is False:
+                return messages_api.get(userId='me', id=msg['id'], **FETCH_PROFILES['metadata'])
+            return threads_api.get(userId='me', id=msg['threadId'], **FETCH_PROFILES['metadata'])
+        
+        for chunk in chunked(sent_messages, batch_size):
+            stored_results = {msg['id']: self.get_stored_result(msg) for msg in chunk}
+            thread_results = execute_batched(
+                self.service,
+                [(msg['id'], fetch_request(msg)) for msg in chunk if not stored_results[msg['id']]],
+                batch_size=batch_size,
+                batch_uri=self.batch_uri,
+                executor=self.gmail
+            )
             
+            for msg in chunk:
+                total_emails += 1
+                
+                stored = stored_results[msg['id']]
+                if stored:
+                    details, has_reply = stored
+                else:
+                    thread, error = thread_results.get(msg['id'], (None, None))
+                    if error or not thread:
+                        logger.error(f"❌ Error checking thread: {error}")
+                        self.metrics.inc('analysis_errors_total', stage='thread')
+                        continue
+                    
+                    if msg.get('reply_plan') is False:
+                        details, has_reply = self.parse_email_details(thread), False
+                    else:
+                        details, has_reply = self.analyze_thread(thread, msg['id'])
+                
+                if not details:
+                    continue
+                
+                logger.info(f"[{total_emails}] Checking: {details['to'][:50]}...")
+                
+                if has_reply:
+                    already_replied.append(details)
+                    logger.info(f"  ✓ Already replied - skipping")
+                else:
+                    needs_followup.append(details)
+                    logger.info(f"  ⚠️  No reply - needs follow-up")
+        
+        return needs_followup, already_replied, total_emails
+    
+    def analyze_emails_concurrent(self, sent_messages, workers=8):
+        """
+        Check sent emails for replies on a pool of worker threads
+        
+        Thread fetches run in parallel, throttled by the quota-unit token bucket
+        instead of a fixed sleep. Results are consumed in submission order, so
+        the output and summary match sequential mode exactly.
+        
+        Args:
+            sent_messages: Any iterable of message stubs, e.g. from iter_sent_emails
+            workers: Number of worker threads
+        
+        Returns:
+            Tuple of (needs_followup, already_replied, total_emails)
+        """
+        total_emails = 0
+        needs_followup = []
+        already_replied = []
+        
+        def record(future):
+            details, has_reply = future.result()
             if not details:
-                continue
+                return
             
-            print(f"[{idx}/{total_emails}] Checking: {details['to'][:50]}...")
-            
-            # Check if they replied
-            has_reply = self.check_for_reply(details['thread_id'], msg_id)
+            logger.info(f"[{total_emails}] Checking: {details['to'][:50]}...")
             
             if has_reply:
                 already_replied.append(details)
-                print(f"  ✓ Already replied - skipping")
+                logger.info(f"  ✓ Already replied - skipping")
             else:
                 needs_followup.append(details)
-                print(f"  ⚠️  No reply - needs follow-up")
+                logger.info(f"  ⚠️  No reply - needs follow-up")
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Bound the number of in-flight fetches so memory stays flat on huge mailboxes
+            pending = deque()
+            for msg in sent_messages:
+                pending.append(pool.submit(self.analyze_message, msg))
+                if len(pending) >= workers * 4:
+                    total_emails += 1
+                    record(pending.popleft())
             
-            # Small delay to avoid rate limits
-            time.sleep(0.5)
+            while pending:
+                total_emails += 1
+                record(pending.popleft())
+        
+        return needs_followup, already_replied, total_emails
+    
+    def run_followup_campaign(self, days_ago=7, subject_keywords=None, dry_run=True, batch_size=None,
+                              state_db=None, workers=None, outbox=None, campaign_id=None,
+                              skip_replied_recipients=False, max_followups_per_recipient=None,
+                              followup_window_days=FOLLOWUP_WINDOW_DAYS, plan_replies=False, drafts=None):
+        """
+        Main function to run the follow-up campaign
+        
+        Args:
+            days_ago: How many days back to search for sent emails
+            subject_keywords: Filter emails by subject keywords
+            dry_run: If True, only show what would be sent without actually sending
+            batch_size: If set, analyze emails with Gmail batch requests of this size
+            state_db: If set, path to a SQLite state file; only threads that changed
+                since the last run are fetched again
+            workers: If set, analyze emails concurrently on this many worker threads
+            outbox: If set, path to a SQLite outbox; follow-ups are queued there
+                before sending, and a run that finds unsent entries for the
+                campaign resumes sending them without analyzing again
+            campaign_id: Identifies the campaign in the outbox (default: today's date);
+                each thread gets at most one follow-up per campaign
+            skip_replied_recipients: Skip people who replied in any other thread
+            max_followups_per_recipient: Most follow-ups one person may get within
+                followup_window_days, counting those already sent (None for no cap)
+            followup_window_days: Length of the per-recipient cap window
+            plan_replies: Run the complementary inbound search first and only fetch
+                threads it can't settle: those we did not start that someone else
+                also wrote in. Ignored with the recipient rules, which need every
+                thread's participants.
+            drafts: If set, path to a SQLite draft store; follow-ups are written
+                as Gmail drafts for review instead of being sent, and
+                send_approved_drafts sends them later. Takes precedence over outbox.
+        
+        Returns:
+            Summary dict with the number of emails analyzed, replied, needing a
+            follow-up, skipped by the recipient rules, drafted, sent and failed
+        """
+        self.reset_metrics()
+        summary = {'total_emails': 0, 'already_replied': 0, 'needs_followup': 0, 'skipped_recipients': 0,
+                   'drafted': 0, 'sent': 0, 'failed': 0, 'dry_run': dry_run}
+        
+        logger.info("="*60)
+        logger.info("📧 EMAIL FOLLOW-UP AGENT")
+        logger.info("="*60)
+        
+        # Drafts mode - follow-ups become Gmail drafts, sent later by send_approved_drafts
+        use_drafts = bool(drafts) and not dry_run
+        # Decided per run; an outbox opened by an earlier run on this agent does not carry over
+        use_outbox = bool(outbox) and not dry_run and not use_drafts
+        if use_drafts:
+            campaign_id = self.start_drafts(drafts, campaign_id)
+        
+        # Outbox mode - finish an interrupted campaign before starting a new analysis
+        elif use_outbox:
+            campaign_id = self.start_outbox(outbox, campaign_id)
+            counts = self.outbox.counts(campaign_id)
+            unsent = counts.get(Outbox.PENDING, 0) + counts.get(Outbox.SENDING, 0)
+            if unsent:
+                logger.info(f"\n📮 Resuming campaign {campaign_id}: {unsent} queued follow-ups left to send\n")
+                with self.metrics.stage('send'):
+                    sent, failed = self.drain_outbox(campaign_id)
+                summary.update(sent=sent, failed=failed, resumed=True)
+                logger.info("\n✅ Follow-up campaign complete!")
+                return self.record_campaign(summary)
+        
+        # Resolve our own addresses once, before any worker needs them for reply detection
+        self.get_own_addresses()
+        
+        # Index threads by recipient as they are analyzed, for the per-person skip rules
+        self.start_recipient_index(skip_replied_recipients, max_followups_per_recipient, followup_window_days)
+        
+        # Incremental mode - reuse results for threads that have not changed
+        history_id = self.start_incremental_scan(state_db) if state_db else None
+        
+        # Stream sent emails - analysis starts as soon as the first page arrives
+        logger.info(f"\n🔍 Searching for emails sent in the last {days_ago} days...")
+        self.planned_replies = 0
+        sent_messages = self.iter_sent_emails(days_ago, subject_keywords,
+                                              plan_replies=plan_replies and not self.recipient_policy)
+        
+        logger.info(f"\n📊 Analyzing emails for replies...\n")
+        
+        # Check each email for replies
+        with self.metrics.stage('analyze'):
+            if workers:
+                needs_followup, already_replied, total_emails = self.analyze_emails_concurrent(sent_messages, workers)
+            elif batch_size:
+                needs_followup, already_replied, total_emails = self.analyze_emails_batched(sent_messages, batch_size)
+            else:
+                needs_followup, already_replied, total_emails = self.analyze_emails(sent_messages)
+        
+        if state_db:
+            self.finish_incremental_scan(history_id)
+        
+        # Applied once every thread is indexed, so replies anywhere in the mailbox count
+        needs_followup, skipped = self.filter_recipients(needs_followup)
+        
+        # Threads the search showed were replied to never reached the analysis
+        total_emails += self.planned_replies
+        replied = len(already_replied) + self.planned_replies
+        summary.update(total_emails=total_emails, already_replied=replied,
+                       needs_followup=len(needs_followup), skipped_recipients=skipped)
+        
+        if not total_emails:
+            logger.warning("\n⚠️  No sent emails found matching your criteria")
+            return self.record_campaign(summary)
         
         # Summary
-        print("\n" + "="*60)
-        print("📊 SUMMARY")
-        print("="*60)
-        print(f"Total emails analyzed: {total_emails}")
-        print(f"Already replied: {len(already_replied)}")
-        print(f"Need follow-up: {len(needs_followup)}")
-        print("="*60)
-        
-        # Send follow-ups
-        if needs_followup:
-            print(f"\n📤 {'[DRY RUN] Would send' if dry_run else 'Sending'} {len(needs_followup)} follow-up emails...\n")
+        logger.info("\n" + "="*60)
+        logger.info("📊 SUMMARY")
+        logger.info("="*60)
+        logger.info(f"Total emails analyzed: {total_emails}")
+        logger.info(f"Already replied: {replied}" + (f" ({self.planned_replies} from search results alone)"
+                                                     if self.planned_replies else ""))
+        logger.info(f"Need follow-up: {len(needs_followup)}")
+        if skipped:
+            logger.info(f"Skipped by recipient rules: {skipped}")
+        logger.info("="*60)
+        
+        # Render every body up front, so the sends only build and send messages
+        with self.metrics.stage('generate'):
+            self.templates.render_all(needs_followup)
+        
+        # Send follow-ups, or leave them as drafts for review
+        if needs_followup and use_drafts:
+            drafted, failed = self.create_followup_drafts(needs_followup, campaign_id, batch_size or DEFAULT_BATCH_SIZE)
+            summary.update(drafted=drafted, failed=failed)
+            logger.info(f"\n📝 Created {drafted} Gmail drafts for campaign {campaign_id}"
+                        f"{f' ({failed} failed)' if failed else ''}")
+            logger.info("Review them in Gmail, delete any you don't want, then run send_approved_drafts")
+        
+        elif needs_followup and use_outbox:
+            queued = self.queue_followups(needs_followup, campaign_id)
+            logger.info(f"\n📮 Queued {queued} follow-up emails ({len(needs_followup) - queued} already queued "
+                        f"for campaign {campaign_id})\n")
             
-            for idx, email in enumerate(needs_followup, 1):
-                print(f"[{idx}/{len(needs_followup)}] {email['to']}")
-                
-                if not dry_run:
-                    self.send_followup(
-                        email['to'],
-                        email['subject'],
-                        email['thread_id'],
-                        email['subject']
-                    )
-                    # Rate limiting - wait 2 seconds between sends
-                    time.sleep(2)
-                else:
-                    print(f"  [DRY RUN] Would send follow-up")
+            with self.metrics.stage('send'):
+                sent, failed = self.drain_outbox(campaign_id)
+            summary.update(sent=sent, failed=failed)
         
-        print("\n✅ Follow-up campaign complete!")
+        elif needs_followup:
+            action = '[DRY RUN] Would send' if dry_run else 'Sending'
+            logger.info(f"\n📤 {action} {len(needs_followup)} follow-up emails...\n")
+            
+            with self.metrics.stage('send'):
+                for idx, email in enumerate(needs_followup, 1):
+                    logger.info(f"[{idx}/{len(needs_followup)}] {email['to']}")
+                    
+                    if not dry_run:
+                        # Rate limiting - sends have their own limiter
+                        self.metrics.observe('rate_limit_wait_seconds', self.send_limiter.acquire(), limiter='send')
+                        sent = self.send_followup(
+                            email['to'],
+                            email['subject'],
+                            email['thread_id'],
+                            email['subject'],
+                            email.get('recipient_name'),
+                            email['followup_body'],
+                            email.get('message_id'),
+                            email.get('references')
+                        )
+                        summary['sent' if sent else 'failed'] += 1
+                        self.metrics.inc('followups_total', result='sent' if sent else 'failed')
+                    else:
+                        logger.info(f"  [DRY RUN] Would send follow-up")
+        
+        logger.info("\n✅ Follow-up campaign complete!")
         
         if dry_run:
-            print("\n⚠️  This was a DRY RUN - no emails were actually sent")
-            print("Run with dry_run=False to send actual follow-ups")
+            logger.info("\n⚠️  This was a DRY RUN - no emails were actually sent")
+            logger.info("Run with dry_run=False to send actual follow-ups")
+        
+        return self.record_campaign(summary)
 
 
 def main():
     """Main execution function"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     
     # Initialize the agent
     agent = EmailFollowupAgent()
@@ -312,10 +533,10 @@ def main():
     SUBJECT_KEYWORDS = ['application', 'opportunity', 'position', 'job', 'resume']  # Filter by these keywords (optional)
     DRY_RUN = True  # Set to False to actually send emails
     
-    print("\n⚙️  Configuration:")
-    print(f"   Days back: {DAYS_BACK}")
-    print(f"   Subject keywords: {SUBJECT_KEYWORDS if SUBJECT_KEYWORDS else 'None (all emails)'}")
-    print(f"   Dry run: {DRY_RUN}")
+    logger.info("\n⚙️  Configuration:")
+    logger.info(f"   Days back: {DAYS_BACK}")
+    logger.info(f"   Subject keywords: {SUBJECT_KEYWORDS if SUBJECT_KEYWORDS else 'None (all emails)'}")
+    logger.info(f"   Dry run: {DRY_RUN}")
     
     # Run the campaign
     agent.run_followup_campaign(
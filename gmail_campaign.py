@@ -0,0 +1,622 @@
+"""
+Gmail-side campaign plumbing shared by both follow-up agents
+Authentication, the sent-folder search and reply planning, reply checks,
+the recipient policy, incremental scans, and queuing, drafting and sending
+follow-ups through the outbox and draft store, so a fix to any of them
+applies to both agents at once
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+from gmail_client import (
+    create_drafts, dedupe_by_thread, get_history_id, get_own_addresses, is_own_message, iter_list_pages,
+    list_changed_threads, list_draft_ids, list_inbound_threads, may_have_succeeded, plan_reply_check,
+    thread_sent_since, GmailRequestExecutor, GmailSession, DEFAULT_BATCH_SIZE, FETCH_PROFILES
+)
+from message_builder import build_messages
+from metrics import Metrics
+from recipients import RecipientIndex, FOLLOWUP_WINDOW_DAYS
+from state_store import DraftStore, Outbox, ThreadStateStore
+
+logger = logging.getLogger(__name__)
+
+
+class GmailCampaignMixin:
+    """
+    Campaign methods that only talk to Gmail and the local stores
+
+    The agent's __init__ sets the attributes used here: the Gmail settings
+    (token_path, credentials_path, gmail_api_endpoint, quota_units_per_sec),
+    metrics and metrics_path, send_limiter, and state_store, changed_threads,
+    outbox, draft_store, own_addresses, recipient_index, recipient_policy and
+    planned_replies. Agents provide parse_email_details and analyze_thread,
+    and may override followup_recipient and ensure_followup_bodies.
+    """
+    
+    def authenticate(self):
+        """Authenticate with Gmail API"""
+        self.session = GmailSession(self.token_path, self.credentials_path, api_endpoint=self.gmail_api_endpoint)
+        self.session.start_background_refresh()
+        self.service = self.session.service
+        self.gmail = GmailRequestExecutor(
+            quota_units_per_sec=self.quota_units_per_sec,
+            http_factory=self.session.authorized_http,
+            metrics=self.metrics
+        )
+        logger.info("✓ Successfully authenticated with Gmail")
+    
+    def reset_metrics(self):
+        """Start a fresh metrics registry so each run's metrics cover that run only"""
+        self.metrics = Metrics()
+        if self.gmail is not None:
+            self.gmail.metrics = self.metrics
+    
+    def build_sent_query(self, days_ago=7, subject_keywords=None):
+        """Build the Gmail search query for emails sent in the last N days"""
+        # Calculate the date for the query
+        date_filter = (datetime.now() - timedelta(days=days_ago)).strftime('%Y/%m/%d')
+        
+        # Build query
+        query = f'in:sent after:{date_filter}'
+        
+        if subject_keywords:
+            keyword_query = ' OR '.join([f'subject:{kw}' for kw in subject_keywords])
+            query += f' ({keyword_query})'
+        
+        return query
+    
+    def find_inbound_threads(self, days_ago=7, subject_keywords=None):
+        """
+        Return the IDs of threads where someone else wrote in the last N days
+        
+        Uses the same window and subject keywords as the sent search, and
+        leaves out messages from our own addresses like thread_has_reply does.
+        
+        Returns:
+            Set of thread IDs, or None if the search failed
+        """
+        date_filter = (datetime.now() - timedelta(days=days_ago)).strftime('%Y/%m/%d')
+        try:
+            inbound_threads = list_inbound_threads(self.service, date_filter, self.gmail,
+                                                   self.get_own_addresses(), subject_keywords)
+        except Exception as e:
+            logger.error(f"❌ Error searching for replies - checking every thread instead: {e}")
+            return None
+        
+        logger.info(f"🔎 {len(inbound_threads)} threads have messages from others since {date_filter}")
+        return inbound_threads
+    
+    def iter_sent_emails(self, days_ago=7, subject_keywords=None, dedupe_threads=True, plan_replies=False):
+        """
+        Stream emails you sent in the last N days, one results page at a time
+        
+        Follows nextPageToken, so mailboxes with more than 500 matches are not
+        cut off. The next page is only requested once the previous one has been
+        consumed, so memory use stays flat regardless of mailbox size.
+        
+        With plan_replies, the complementary search for messages from others
+        is run first and its thread IDs are matched against each sent thread.
+        Threads known to have a reply are counted in planned_replies and not
+        yielded; threads known to have none are marked with reply_plan=False,
+        so only the message needs fetching. The rest are yielded unchanged.
+        
+        Args:
+            days_ago: How many days back to search (default: 7)
+            subject_keywords: List of keywords to filter subjects (optional)
+            dedupe_threads: Keep only the latest sent message per thread (default: True)
+            plan_replies: Settle reply checks from search results where possible
+                (needs dedupe_threads)
+        """
+        query = self.build_sent_query(days_ago, subject_keywords)
+        inbound_threads = None
+        if plan_replies and dedupe_threads:
+            inbound_threads = self.find_inbound_threads(days_ago, subject_keywords)
+        
+        try:
+            messages = iter_list_pages(
+                self.service.users().messages().list,
+                'messages',
+                executor=self.gmail,
+                userId='me',
+                q=query,
+                maxResults=500
+            )
+            
+            if dedupe_threads:
+                # Only the latest sent message in each thread needs checking
+                messages = dedupe_by_thread(messages)
+            
+            for msg in messages:
+                if inbound_threads is not None:
+                    plan = plan_reply_check(msg, inbound_threads)
+                    self.metrics.inc('reply_plan_total', result={True: 'replied', False: 'no_reply'}.get(plan, 'fetch'))
+                    if plan:
+                        self.planned_replies += 1
+                        continue
+                    if plan is False:
+                        msg = dict(msg, reply_plan=False)
+                yield msg
+        
+        except Exception as e:
+            logger.error(f"❌ Error finding sent emails: {e}")
+    
+    def find_sent_emails(self, days_ago=7, subject_keywords=None, dedupe_threads=True, plan_replies=False):
+        """
+        Find emails you sent in the last N days
+        
+        Args:
+            days_ago: How many days back to search (default: 7)
+            subject_keywords: List of keywords to filter subjects (optional)
+            dedupe_threads: Keep only the latest sent message per thread (default: True)
+            plan_replies: Drop threads the inbound search shows were replied to
+                (counted in planned_replies) and mark those with no reply
+        """
+        logger.info(f"\n🔍 Searching for emails sent in the last {days_ago} days...")
+        
+        messages = list(self.iter_sent_emails(days_ago, subject_keywords, dedupe_threads, plan_replies))
+        logger.info(f"✓ Found {len(messages)} {'sent threads' if dedupe_threads else 'sent emails'}")
+        return messages
+    
+    def check_for_reply(self, thread_id, original_msg_id):
+        """
+        Check if a thread has replies after the original message
+        
+        Args:
+            thread_id: Gmail thread ID
+            original_msg_id: The ID of your original sent message
+        
+        Returns:
+            True or False, or None if the thread could not be fetched
+        """
+        try:
+            thread = self.gmail.execute(self.service.users().threads().get(
+                userId='me',
+                id=thread_id,
+                **FETCH_PROFILES['metadata']
+            ))
+            
+            return self.thread_has_reply(thread, original_msg_id)
+        
+        except Exception as e:
+            # Unknown is not the same as "no reply" - never treat a failed check as a reason to send
+            logger.error(f"❌ Error checking for reply: {e}")
+            self.metrics.inc('analysis_errors_total', stage='thread')
+            return None
+    
+    def thread_has_reply(self, thread, original_msg_id):
+        """
+        Check if a fetched thread has replies after the original message
+        
+        Args:
+            thread: Gmail thread resource
+            original_msg_id: The ID of your original sent message
+        """
+        messages = thread.get('messages', [])
+        
+        # Find the original message timestamp
+        original_timestamp = None
+        for msg in messages:
+            if msg['id'] == original_msg_id:
+                original_timestamp = int(msg['internalDate'])
+                break
+        
+        if not original_timestamp:
+            return False
+        
+        own_addresses = self.get_own_addresses()
+        
+        # Check if there are any messages after the original that are not from us
+        for msg in messages:
+            if int(msg['internalDate']) > original_timestamp and not is_own_message(msg, own_addresses):
+                return True
+        
+        return False
+    
+    def get_own_addresses(self):
+        """
+        Return our own normalized email addresses, resolved once per agent
+        
+        Uses the account address and send-as aliases. If they can't be fetched,
+        only the SENT label is used to recognize our own messages.
+        """
+        if self.own_addresses is None:
+            try:
+                self.own_addresses = get_own_addresses(self.service, self.gmail)
+            except Exception as e:
+                logger.error(f"❌ Error resolving your email addresses: {e}")
+                self.own_addresses = set()
+        return self.own_addresses
+    
+    def start_recipient_index(self, skip_replied=False, max_followups=None, window_days=FOLLOWUP_WINDOW_DAYS):
+        """
+        Start this run's recipient index and set the per-recipient skip policy
+        
+        Args:
+            skip_replied: Skip recipients who replied in any of our threads
+            max_followups: Most follow-ups one recipient may get within window_days (None for no cap)
+            window_days: Length of the follow-up cap window
+        """
+        self.recipient_index = RecipientIndex()
+        self.recipient_policy = {}
+        if skip_replied or max_followups is not None:
+            self.recipient_policy = {'skip_replied': skip_replied, 'max_followups': max_followups,
+                                     'window_days': window_days}
+    
+    def recipient_skip_reason(self, thread_id):
+        """Return why every recipient of an indexed thread is excluded by the policy, or None"""
+        if not self.recipient_policy or self.recipient_index is None:
+            return None
+        return self.recipient_index.skip_reason(self.recipient_index.recipients_of(thread_id),
+                                                **self.recipient_policy)
+    
+    def filter_recipients(self, needs_followup):
+        """
+        Drop follow-ups whose recipients all replied elsewhere or reached the follow-up cap
+        
+        Follow-ups kept earlier in the list count toward the cap, so a person
+        with several unanswered threads gets at most the allowed number.
+        
+        Returns:
+            Tuple of (kept follow-ups, number skipped)
+        """
+        if not self.recipient_policy:
+            return needs_followup, 0
+        
+        kept = []
+        planned = Counter()
+        for email in needs_followup:
+            reason = self.recipient_index.skip_reason(email.get('recipients'), planned=planned,
+                                                      **self.recipient_policy)
+            if reason:
+                self.metrics.inc('recipient_skips_total', reason=reason)
+                logger.info(f"  ⏭️  {email.get('recipient_email') or email['to']}: "
+                            f"{reason.replace('_', ' ')} - skipping")
+                continue
+            planned.update(email.get('recipients') or [])
+            kept.append(email)
+        
+        return kept, len(needs_followup) - len(kept)
+    
+    def start_incremental_scan(self, state_db):
+        """
+        Open the local state store and find threads changed since the last run
+        
+        Args:
+            state_db: Path to the SQLite state file
+        
+        Returns:
+            The mailbox historyId to save once analysis has finished (None on error)
+        """
+        self.state_store = ThreadStateStore(state_db)
+        self.changed_threads = None
+        
+        # Stored threads tell us who we wrote to before anything is fetched
+        if self.recipient_policy:
+            indexed = self.recipient_index.load(self.state_store)
+            logger.info(f"📇 Indexed {indexed} stored threads by recipient")
+        
+        try:
+            history_id = get_history_id(self.service, self.gmail)
+            last_history_id = self.state_store.get_meta('history_id')
+            if last_history_id:
+                self.changed_threads = list_changed_threads(self.service, last_history_id, self.gmail)
+        except Exception as e:
+            logger.error(f"❌ Error reading mailbox history: {e}")
+            return None
+        
+        if self.changed_threads is None:
+            logger.info("📂 No usable scan history - analyzing every thread")
+        else:
+            logger.info(f"📂 {len(self.changed_threads)} threads changed since the last run")
+        
+        return history_id
+    
+    def finish_incremental_scan(self, history_id):
+        """Save the mailbox history position and close the state store"""
+        if history_id:
+            self.state_store.set_meta('history_id', history_id)
+        self.state_store.close()
+        self.state_store = None
+        self.changed_threads = None
+    
+    def get_stored_result(self, msg):
+        """
+        Return the stored (details, has_reply) for a thread that has not changed
+        
+        Returns None when the thread must be fetched: no incremental scan is
+        running, the thread changed, or a newer message was sent in it. A
+        changed thread is still served from the store when the recipient
+        policy already excludes all its recipients, since it gets no
+        follow-up either way.
+        """
+        if self.state_store is None:
+            return None
+        
+        unchanged = self.changed_threads is not None and msg['threadId'] not in self.changed_threads
+        if not unchanged and not self.recipient_skip_reason(msg['threadId']):
+            return None
+        
+        state = self.state_store.get_thread(msg['threadId'])
+        if not state or state['message_id'] != msg['id']:
+            self.metrics.inc('state_store_lookups_total', result='miss')
+            return None
+        
+        self.metrics.inc('state_store_lookups_total', result='hit' if unchanged else 'recipient_skip')
+        return state['details'], state['has_reply']
+    
+    def followup_recipient(self, email):
+        """Return the recipient label used in logs and stored in the outbox and draft store"""
+        return email['to']
+    
+    def ensure_followup_bodies(self, emails):
+        """Give every email a 'followup_body' before its message is built"""
+        self.templates.render_all(emails)
+    
+    def build_followups(self, emails):
+        """
+        Build the raw message of each follow-up, in the 'build' stage
+        
+        A follow-up that can't be encoded (e.g. a non-ASCII address) is logged
+        and left out, so it doesn't stop the rest of the campaign.
+        
+        Returns:
+            List of (email, message) pairs for the messages that were built
+        """
+        with self.metrics.stage('build'):
+            results = build_messages(emails)
+        
+        built = []
+        for email, (message, error) in zip(emails, results):
+            if error:
+                logger.error(f"  ❌ Could not build follow-up to {self.followup_recipient(email)}: {error}")
+                self.metrics.inc('followups_total', result='invalid')
+                continue
+            built.append((email, message))
+        return built
+    
+    def start_drafts(self, drafts_path, campaign_id=None):
+        """Open the draft store and return the campaign id to use (default: today's date)"""
+        if self.draft_store is None or self.draft_store.path != drafts_path:
+            self.draft_store = DraftStore(drafts_path)
+        return campaign_id or datetime.now().strftime('%Y-%m-%d')
+    
+    def create_followup_drafts(self, needs_followup, campaign_id, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Write each follow-up as a Gmail draft in its thread, with batched drafts.create calls
+        
+        Threads that already have a draft for this campaign are skipped. The
+        draft IDs are recorded so send_approved_drafts can send them later.
+        
+        Returns:
+            Tuple of (drafted, failed)
+        """
+        pending = [email for email in needs_followup
+                   if not self.draft_store.is_drafted(campaign_id, email['thread_id'])]
+        self.ensure_followup_bodies(pending)
+        built = self.build_followups(pending)
+        
+        with self.metrics.stage('draft'):
+            results = create_drafts(self.service, [message for _, message in built], batch_size, self.batch_uri,
+                                    self.gmail)
+        
+        created = []
+        for (email, _), (draft_id, error) in zip(built, results):
+            recipient = self.followup_recipient(email)
+            if draft_id:
+                created.append((email['thread_id'], recipient, draft_id))
+            else:
+                logger.error(f"  ❌ Failed to create draft for {recipient}: {error}")
+        
+        self.draft_store.add_many(campaign_id, created)
+        failed = len(pending) - len(created)
+        self.metrics.inc('drafts_total', len(created), result='created')
+        self.metrics.inc('drafts_total', failed, result='failed')
+        return len(created), failed
+    
+    def settle_missing_draft(self, entry):
+        """
+        Resolve an entry whose draft is no longer in Gmail
+        
+        It counts as sent if its thread has a message we sent since the entry
+        was last updated (sent from Gmail, or by an interrupted run); otherwise
+        the reviewer deleted the draft and it is discarded.
+        """
+        thread = self.gmail.execute(self.service.users().threads().get(
+            userId='me',
+            id=entry['thread_id'],
+            **FETCH_PROFILES['metadata']
+        ))
+        
+        if thread_sent_since(thread, entry['updated_at']):
+            self.draft_store.mark_sent(entry['key'])
+            return DraftStore.SENT
+        
+        self.draft_store.mark_discarded(entry['key'])
+        return DraftStore.DISCARDED
+    
+    def send_approved_drafts(self, drafts_path, campaign_id=None):
+        """
+        Send a drafts-mode campaign's approved drafts, at the configured send rate
+        
+        A draft still in Gmail counts as approved and is sent as it is now,
+        including any edits the reviewer made; deleting a draft rejects it.
+        Each entry is marked as sending before the API call, so running this
+        again after an interruption never sends a draft twice.
+        
+        Args:
+            drafts_path: SQLite draft store written by a drafts-mode campaign
+            campaign_id: Campaign whose drafts to send (default: today's date)
+        
+        Returns:
+            Summary dict with the number of drafts sent, already sent from
+            Gmail, discarded and failed
+        """
+        self.reset_metrics()
+        campaign_id = self.start_drafts(drafts_path, campaign_id)
+        summary = {'sent': 0, 'already_sent': 0, 'discarded': 0, 'failed': 0}
+        existing = list_draft_ids(self.service, self.gmail)
+        
+        # Interrupted sends whose draft is still there were never sent
+        for entry in self.draft_store.entries(campaign_id, DraftStore.SENDING):
+            if entry['draft_id'] in existing:
+                self.draft_store.release(entry['key'])
+        
+        entries = self.draft_store.entries(campaign_id, DraftStore.SENDING) + \
+            self.draft_store.entries(campaign_id, DraftStore.DRAFTED)
+        logger.info(f"\n📤 Sending approved drafts for campaign {campaign_id} ({len(entries)} on record)...\n")
+        
+        with self.metrics.stage('send'):
+            for idx, entry in enumerate(entries, 1):
+                if entry['draft_id'] not in existing:
+                    try:
+                        status = self.settle_missing_draft(entry)
+                    except Exception as e:
+                        # Leave the entry as it is; the next run checks it again
+                        logger.error(f"❌ Error checking the thread of {entry['recipient']}: {e}")
+                        continue
+                    summary['already_sent' if status == DraftStore.SENT else 'discarded'] += 1
+                    continue
+                
+                logger.info(f"[{idx}/{len(entries)}] {entry['recipient']}")
+                self.metrics.observe('rate_limit_wait_seconds', self.send_limiter.acquire(), limiter='send')
+                self.draft_store.mark_sending(entry['key'])
+                try:
+                    response = self.gmail.execute(self.service.users().drafts().send(
+                        userId='me',
+                        body={'id': entry['draft_id']}
+                    ))
+                except Exception as e:
+                    if may_have_succeeded(e):
+                        # The next run sends it only if the draft is still there
+                        self.draft_store.mark_unconfirmed(entry['key'], e)
+                        logger.error(f"  ❌ No answer sending draft to {entry['recipient']}: {e} "
+                                     f"(checked next run)")
+                        self.metrics.inc('followups_total', result='unconfirmed')
+                    else:
+                        status = self.draft_store.mark_failed(entry['key'], e, entry['attempts'] + 1)
+                        logger.error(f"  ❌ Failed to send draft to {entry['recipient']}: {e}"
+                                     f"{' (will retry next run)' if status == DraftStore.DRAFTED else ''}")
+                        self.metrics.inc('followups_total', result='failed')
+                    summary['failed'] += 1
+                    continue
+                
+                self.draft_store.mark_sent(entry['key'], response.get('id'))
+                logger.info(f"  ✓ Sent draft to {entry['recipient']}")
+                self.metrics.inc('followups_total', result='sent')
+                summary['sent'] += 1
+        
+        logger.info(f"\n✅ Sent {summary['sent']} drafts ({summary['discarded']} discarded, "
+                    f"{summary['already_sent']} already sent, {summary['failed']} failed)")
+        return self.record_campaign(summary)
+    
+    def start_outbox(self, outbox_path, campaign_id=None):
+        """Open the outbox and return the campaign id to use (default: today's date)"""
+        if self.outbox is None or self.outbox.path != outbox_path:
+            self.outbox = Outbox(outbox_path)
+        return campaign_id or datetime.now().strftime('%Y-%m-%d')
+    
+    def queue_followups(self, needs_followup, campaign_id):
+        """
+        Prepare each follow-up message and store it in the outbox
+        
+        Threads already queued for this campaign are skipped, so re-running a
+        campaign never gives a thread a second follow-up, even before the first
+        one shows up in the sent-folder search.
+        
+        Returns:
+            Number of newly queued messages
+        """
+        if not campaign_id:
+            raise ValueError("Outbox campaign id is not set")
+        pending = [email for email in needs_followup if not self.outbox.is_queued(campaign_id, email['thread_id'])]
+        self.ensure_followup_bodies(pending)
+        
+        # Build every raw message first, then queue them in one transaction
+        built = self.build_followups(pending)
+        return self.outbox.enqueue_many(campaign_id, [
+            (email['thread_id'], self.followup_recipient(email), message) for email, message in built
+        ])
+    
+    def verify_in_flight(self, campaign_id):
+        """
+        Settle outbox entries left mid-send by an interrupted run or an unconfirmed send
+        
+        An entry counts as sent if its thread has a message we sent after the
+        entry was claimed; otherwise it goes back to the queue, or fails once
+        it has used all its attempts.
+        """
+        for entry in self.outbox.entries(campaign_id, Outbox.SENDING):
+            try:
+                thread = self.gmail.execute(self.service.users().threads().get(
+                    userId='me',
+                    id=entry['thread_id'],
+                    **FETCH_PROFILES['metadata']
+                ))
+            except Exception as e:
+                # Leave the entry claimed; the next run checks it again
+                logger.error(f"❌ Error checking interrupted send to {entry['recipient']}: {e}")
+                continue
+            
+            if thread_sent_since(thread, entry['updated_at']):
+                self.outbox.mark_sent(entry['key'])
+            elif entry['attempts'] >= self.outbox.max_attempts:
+                self.outbox.mark_failed(entry['key'], "Not sent after the last attempt", entry['attempts'])
+            else:
+                self.outbox.release(entry['key'])
+    
+    def drain_outbox(self, campaign_id):
+        """
+        Send the campaign's queued messages in order, at the configured send rate
+        
+        Each entry is marked as sending before the API call and as sent right
+        after it, so a restart continues with the next unsent message. A send
+        that fails without a clear answer (timeout, 5xx) may still have gone
+        out, so its entry stays claimed until verify_in_flight checks the
+        thread; only rejected sends go back to the queue.
+        
+        Returns:
+            Tuple of (sent, failed)
+        """
+        self.verify_in_flight(campaign_id)
+        pending = self.outbox.entries(campaign_id, Outbox.PENDING)
+        sent = failed = 0
+        
+        for idx, entry in enumerate(pending, 1):
+            logger.info(f"[{idx}/{len(pending)}] {entry['recipient']}")
+            
+            self.metrics.observe('rate_limit_wait_seconds', self.send_limiter.acquire(), limiter='send')
+            self.outbox.mark_sending(entry['key'])
+            try:
+                response = self.gmail.execute(self.service.users().messages().send(
+                    userId='me',
+                    body=entry['message']
+                ))
+            except Exception as e:
+                if may_have_succeeded(e):
+                    self.outbox.mark_unconfirmed(entry['key'], e)
+                    logger.error(f"  ❌ No answer sending follow-up to {entry['recipient']}: {e} "
+                                 f"(its thread is checked next run)")
+                    self.metrics.inc('followups_total', result='unconfirmed')
+                else:
+                    status = self.outbox.mark_failed(entry['key'], e, entry['attempts'] + 1)
+                    logger.error(f"  ❌ Failed to send follow-up to {entry['recipient']}: {e}"
+                                 f"{' (will retry next run)' if status == Outbox.PENDING else ''}")
+                    self.metrics.inc('followups_total', result='failed')
+                failed += 1
+                continue
+            
+            self.outbox.mark_sent(entry['key'], response.get('id'))
+            logger.info(f"  ✓ Sent follow-up to {entry['recipient']}")
+            self.metrics.inc('followups_total', result='sent')
+            sent += 1
+        
+        return sent, failed
+    
+    def record_campaign(self, summary):
+        """Add per-stage timings to a campaign summary and write the metrics file, if any"""
+        summary['stage_seconds'] = self.metrics.stage_seconds()
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+        return summary
@@ -0,0 +1,772 @@
+"""
+Shared Gmail API helpers used by both follow-up agents
+Manages OAuth sessions, batches individual API calls, follows pagination,
+reads mailbox history and throttles and retries requests against the Gmail
+per-user quota
+"""
+
+import json
+import logging
+import os
+import pickle
+import random
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime
+from email.utils import parseaddr, parsedate_to_datetime
+
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Gmail API scopes
+SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+
+# Local copy of the Gmail discovery document, so the service is built without a fetch;
+# kept next to this module so every process finds it, whatever its working directory
+DISCOVERY_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.gmail_discovery_v1.json')
+DISCOVERY_URL = 'https://gmail.googleapis.com/$discovery/rest?version=v1'
+
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Gmail rejects batches with more than 100 calls and recommends 50 or fewer
+GMAIL_BATCH_LIMIT = 100
+DEFAULT_BATCH_SIZE = 50
+
+# Gmail per-user rate limit, in quota units per second
+GMAIL_QUOTA_UNITS_PER_SECOND = 250
+
+# Quota units charged per call (https://developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.send': 100,
+    'gmail.users.threads.get': 10,
+    'gmail.users.drafts.create': 10,
+    'gmail.users.drafts.list': 5,
+    'gmail.users.drafts.send': 100,
+    'gmail.users.settings.sendAs.list': 1,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+# Fetch profiles: reply detection and follow-up details only need a few headers,
+# so threads are fetched as metadata and full bodies only when they are used
+METADATA_HEADERS = ['From', 'To', 'Cc', 'Subject', 'Message-ID', 'References']
+FETCH_PROFILES = {
+    'metadata': {'format': 'metadata', 'metadataHeaders': METADATA_HEADERS},
+    'full': {'format': 'full'},
+}
+
+# Search for messages someone else wrote; used to plan reply checks before fetching threads
+INBOUND_QUERY = '-in:sent -in:drafts -in:chats'
+
+# Default spacing between sends: one every 2 seconds
+DEFAULT_SENDS_PER_SECOND = 0.5
+
+# Allowed difference between our clock and Gmail's when checking whether an interrupted send went out
+SEND_CLOCK_SKEW_SECONDS = 60
+
+# Retry policy for rate-limited and transient failures
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 64
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+TRANSIENT_EXCEPTIONS = (ConnectionError, TimeoutError, socket.timeout, httplib2.HttpLib2Error)
+
+RATE_LIMITED = 'rate_limited'
+TRANSIENT = 'transient'
+
+# Calls that do their work once the server accepts them; a timeout or 5xx may still
+# have sent the message or created the draft, so only rate-limit rejections are retried
+NON_IDEMPOTENT_METHODS = {
+    'gmail.users.messages.send',
+    'gmail.users.drafts.create',
+    'gmail.users.drafts.send',
+}
+
+
+class GmailSession:
+    """
+    Owns the OAuth credentials and Gmail service for one mailbox
+
+    The discovery document is cached on disk, so building the service needs no
+    network round-trip. A background thread refreshes the access token ahead
+    of expiry, so workers never block on a refresh mid-run, and authorized_http()
+    hands out a separate keep-alive transport per caller, since httplib2
+    connections are not thread-safe.
+    """
+
+    def __init__(self, token_path='token.pickle', credentials_path='credentials.json', scopes=SCOPES,
+                 discovery_cache_path=DISCOVERY_CACHE_PATH, credentials=None, api_endpoint=None,
+                 refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS):
+        """
+        Args:
+            token_path: Pickled OAuth token for this mailbox
+            credentials_path: OAuth client secrets, used when no valid token exists
+            scopes: OAuth scopes to request
+            discovery_cache_path: Where to keep the cached discovery document
+            credentials: Ready-made credentials, skipping the token file (optional)
+            api_endpoint: Gmail API root override, e.g. a local fake server (optional)
+            refresh_margin: Seconds before expiry at which tokens are refreshed
+        """
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        self.discovery_cache_path = discovery_cache_path
+        self.api_endpoint = api_endpoint
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+        self.credentials = credentials or self.load_credentials()
+        self.service = self.build_service()
+
+    def load_credentials(self):
+        """Load the pickled token, refreshing it or running the OAuth flow if needed"""
+        creds = None
+
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+                creds = flow.run_local_server(port=0)
+
+            self.save_credentials(creds)
+
+        return creds
+
+    def save_credentials(self, creds):
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def load_discovery_document(self):
+        """Return the Gmail discovery document, from the local cache when possible"""
+        if self.discovery_cache_path and os.path.exists(self.discovery_cache_path):
+            with open(self.discovery_cache_path, encoding='utf-8') as f:
+                return f.read()
+
+        doc = get_static_doc('gmail', 'v1')
+        if not doc:
+            response, content = httplib2.Http().request(DISCOVERY_URL)
+            if response.status != 200:
+                raise RuntimeError(f"Could not fetch the Gmail discovery document (HTTP {response.status})")
+            doc = content.decode('utf-8')
+
+        if self.discovery_cache_path:
+            self.save_discovery_document(doc)
+        return doc
+
+    def save_discovery_document(self, doc):
+        """
+        Write the discovery cache atomically
+
+        Campaign runner processes may start together on a cold cache, so the
+        document is written to a temporary file and renamed into place; a
+        reader never sees a half-written file. The cache is optional, so a
+        failed write is only logged.
+        """
+        directory = os.path.dirname(os.path.abspath(self.discovery_cache_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.gmail_discovery_', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(doc)
+                os.replace(tmp_path, self.discovery_cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"⚠️  Could not cache the Gmail discovery document: {e}")
+
+    def build_service(self):
+        """Build the Gmail service from the cached discovery document"""
+        client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        return build_from_document(
+            self.load_discovery_document(),
+            credentials=self.credentials,
+            client_options=client_options
+        )
+
+    def authorized_http(self):
+        """Return a new keep-alive transport authorized with the shared credentials"""
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+
+    def refresh(self):
+        """Refresh the access token now and save it"""
+        with self._lock:
+            self.credentials.refresh(Request())
+            self.save_credentials(self.credentials)
+
+    def seconds_until_refresh(self):
+        expiry = getattr(self.credentials, 'expiry', None)
+        if not expiry:
+            return self.refresh_margin
+        # google-auth stores expiry as a naive UTC datetime
+        remaining = (expiry - datetime.utcnow()).total_seconds()
+        return max(0.0, remaining - self.refresh_margin)
+
+    def start_background_refresh(self):
+        """Keep the access token fresh from a daemon thread until stop() is called"""
+        if self._refresher or not getattr(self.credentials, 'refresh_token', None):
+            return
+
+        def run():
+            while not self._stop.wait(self.seconds_until_refresh()):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"⚠️  Token refresh failed, retrying shortly: {e}")
+                    if self._stop.wait(30):
+                        return
+
+        self._refresher = threading.Thread(target=run, name='gmail-token-refresh', daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def classify_error(error):
+    """
+    Classify a failed Gmail call
+
+    Returns:
+        RATE_LIMITED for 429 and quota 403s, TRANSIENT for 5xx and network
+        errors, or None if the error is permanent and should not be retried
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429:
+            return RATE_LIMITED
+        if status == 403:
+            try:
+                errors = json.loads(error.content)['error'].get('errors', [])
+            except (ValueError, KeyError, TypeError):
+                errors = []
+            if any(e.get('reason') in RATE_LIMIT_REASONS for e in errors):
+                return RATE_LIMITED
+            return None
+        if status in TRANSIENT_STATUSES:
+            return TRANSIENT
+        return None
+
+    if isinstance(error, TRANSIENT_EXCEPTIONS):
+        return TRANSIENT
+    return None
+
+
+def is_idempotent(request):
+    """Return whether an HttpRequest or BatchHttpRequest can safely be sent twice"""
+    if isinstance(request, BatchHttpRequest):
+        return all(is_idempotent(r) for r in request._requests.values())
+    return getattr(request, 'methodId', None) not in NON_IDEMPOTENT_METHODS
+
+
+def retry_kind(error, request):
+    """
+    Return how a failed call may be retried: RATE_LIMITED, TRANSIENT or None
+
+    Like classify_error, except that transient failures of send and create
+    calls are not retried, since the server may already have done the work.
+    """
+    kind = classify_error(error)
+    if kind == TRANSIENT and not is_idempotent(request):
+        return None
+    return kind
+
+
+def may_have_succeeded(error):
+    """Return whether a failed send or create call may still have been carried out (5xx or network error)"""
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500
+    return isinstance(error, TRANSIENT_EXCEPTIONS)
+
+
+def retry_after_seconds(error):
+    """Return the server's Retry-After delay in seconds, or None if it sent none"""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def request_method(request):
+    """Return the API method name of a request, used as a metrics label"""
+    if isinstance(request, BatchHttpRequest):
+        return 'batch'
+    return getattr(request, 'methodId', None) or 'unknown'
+
+
+def quota_units(request):
+    """Return the quota cost of an HttpRequest or BatchHttpRequest"""
+    if isinstance(request, BatchHttpRequest):
+        return sum(quota_units(r) for r in request._requests.values())
+    return QUOTA_UNITS.get(getattr(request, 'methodId', None), DEFAULT_QUOTA_UNITS)
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter
+
+    Tokens refill continuously at `rate` per second up to `capacity`;
+    acquire() blocks until enough tokens are available. A request larger
+    than the bucket waits for a full bucket and leaves it in debt, so later
+    callers wait for the whole cost to be repaid.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        """Change the refill rate, keeping tokens already earned"""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, consume them and return the seconds spent waiting"""
+        # A request larger than the bucket would never fit - start it once the
+        # bucket is full and charge the full cost, taking the balance negative
+        needed = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return waited
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class GmailRequestExecutor:
+    """
+    Executes Gmail API requests under the per-user quota, with retries
+
+    Every request waits on a token bucket sized in quota units, and runs on a
+    per-thread HTTP transport so worker threads never share an httplib2
+    connection (which is not thread-safe).
+
+    Rate-limited (429, quota 403) and transient (5xx, network) failures are
+    retried with jittered exponential backoff, honoring Retry-After. Sends
+    and draft creation are only retried when rate-limited: after a transient
+    failure the error is raised, since the call may have gone through. A
+    rate-limit response also halves the request rate for every worker; the
+    rate then creeps back up as calls succeed.
+    """
+
+    def __init__(self, credentials=None, quota_units_per_sec=GMAIL_QUOTA_UNITS_PER_SECOND, http_factory=None,
+                 max_retries=MAX_RETRIES, metrics=None):
+        """
+        Args:
+            credentials: OAuth credentials used to authorize each thread's transport
+            quota_units_per_sec: Quota units the limiter allows per second
+            http_factory: Callable returning a new transport, overriding credentials (optional)
+            max_retries: Retries per call before the error is raised
+            metrics: Metrics registry for call counts, quota units, retries and latency (optional)
+        """
+        self.credentials = credentials
+        self.metrics = metrics or Metrics()
+        self.max_rate = quota_units_per_sec
+        self.min_rate = quota_units_per_sec / 32
+        self.rate_limiter = TokenBucket(quota_units_per_sec)
+        self.max_retries = max_retries
+        self._http_factory = http_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def http(self):
+        """Return this thread's HTTP transport, creating it on first use"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            if self._http_factory:
+                http = self._http_factory()
+            elif self.credentials is not None:
+                http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def execute(self, request):
+        """Wait for quota, then execute an HttpRequest or BatchHttpRequest, retrying if needed"""
+        units = quota_units(request)
+        method = request_method(request)
+        attempt = 0
+        while True:
+            waited = self._wait_for_pause() + self.rate_limiter.acquire(units)
+            if waited:
+                self.metrics.observe('rate_limit_wait_seconds', waited, limiter='gmail')
+            self.metrics.inc('gmail_requests_total', method=method)
+            self.metrics.inc('gmail_quota_units_total', units)
+            try:
+                with self.metrics.timer('gmail_request_seconds', method=method):
+                    response = request.execute(http=self.http())
+            except Exception as e:
+                kind = classify_error(e)
+                self.metrics.inc('gmail_errors_total', kind=kind or 'fatal')
+                if retry_kind(e, request) is None or attempt >= self.max_retries:
+                    raise
+                self.backoff(attempt, e, kind)
+                attempt += 1
+                continue
+
+            self._on_success()
+            return response
+
+    def backoff(self, attempt, error, kind=None):
+        """Sleep before retry number attempt + 1, feeding rate limits back into the limiter"""
+        kind = kind or classify_error(error)
+        delay = retry_after_seconds(error)
+        if delay is None:
+            # Full jitter keeps concurrent workers from retrying in lockstep
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+        if kind == RATE_LIMITED:
+            self._on_rate_limited(delay)
+        self.metrics.inc('gmail_retries_total', kind=kind)
+        self.metrics.observe('gmail_backoff_seconds', delay)
+        time.sleep(delay)
+
+    def _wait_for_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return delay
+        return 0.0
+
+    def _on_rate_limited(self, delay):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.rate_limiter.set_rate(max(self.min_rate, self.rate_limiter.rate / 2))
+
+    def _on_success(self):
+        if self.rate_limiter.rate < self.max_rate:
+            with self._lock:
+                self.rate_limiter.set_rate(min(self.max_rate, self.rate_limiter.rate + self.max_rate / 50))
+
+
+def execute_batched(service, requests, batch_size=DEFAULT_BATCH_SIZE, batch_uri=None, executor=None):
+    """
+    Execute Gmail API requests as HTTP batch requests
+
+    With an executor, each batch is throttled and calls inside a batch that
+    fail with a retryable error are re-sent in a later batch after backoff
+    (see retry_kind for which errors are retried).
+
+    Args:
+        service: Authenticated Gmail API service
+        requests: List of (request_id, HttpRequest) pairs; request IDs must be unique
+        batch_size: Calls per batch (capped at GMAIL_BATCH_LIMIT)
+        batch_uri: Batch endpoint override, e.g. a local fake server (optional)
+        executor: GmailRequestExecutor used to throttle and retry (optional)
+
+    Returns:
+        Dict mapping request_id to a (response, exception) tuple
+    """
+    batch_size = max(1, min(batch_size, GMAIL_BATCH_LIMIT))
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    pending = list(requests)
+    attempt = 0
+    while pending:
+        for start in range(0, len(pending), batch_size):
+            if batch_uri:
+                batch = BatchHttpRequest(callback=callback, batch_uri=batch_uri)
+            else:
+                batch = service.new_batch_http_request(callback=callback)
+
+            chunk = pending[start:start + batch_size]
+            for request_id, request in chunk:
+                batch.add(request, request_id=request_id)
+                if executor:
+                    executor.metrics.inc('gmail_batched_calls_total', method=request_method(request))
+
+            try:
+                if executor:
+                    executor.execute(batch)
+                else:
+                    batch.execute()
+            except Exception as e:
+                # The whole batch failed - report the error for every call in it
+                for request_id, _ in chunk:
+                    results[request_id] = (None, e)
+
+        if not executor or attempt >= executor.max_retries:
+            break
+
+        failed = [(request_id, request) for request_id, request in pending
+                  if retry_kind(results[request_id][1], request)]
+        if not failed:
+            break
+
+        executor.backoff(attempt, results[failed[0][0]][1])
+        pending = failed
+        attempt += 1
+
+    return results
+
+
+def iter_list_pages(list_method, items_key, executor=None, **kwargs):
+    """
+    Yield items from a paginated Gmail list call, following nextPageToken
+
+    Args:
+        list_method: Bound list method, e.g. service.users().messages().list
+        items_key: Response key holding the items, e.g. 'messages'
+        executor: GmailRequestExecutor used to throttle and retry (optional)
+        **kwargs: Arguments passed to every list call
+    """
+    page_token = None
+    while True:
+        if page_token:
+            request = list_method(pageToken=page_token, **kwargs)
+        else:
+            request = list_method(**kwargs)
+        response = executor.execute(request) if executor else request.execute()
+
+        for item in response.get(items_key, []):
+            yield item
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def dedupe_by_thread(messages):
+    """
+    Collapse message stubs to one entry per thread, lazily
+
+    messages.list returns the newest messages first, so the first stub seen
+    for each threadId is the latest message in that thread.
+    """
+    seen_threads = set()
+    for msg in messages:
+        if msg['threadId'] not in seen_threads:
+            seen_threads.add(msg['threadId'])
+            yield msg
+
+
+def chunked(items, size):
+    """Yield lists of up to size items from any iterable"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def header_dict(payload):
+    """Return a message's headers as a dict keyed by lower-case header name"""
+    return {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
+
+
+def normalize_address(address):
+    """Return the bare, lower-case email address from a header value like 'Name <a@b.com>'"""
+    return parseaddr(address or '')[1].strip().lower()
+
+
+def get_own_addresses(service, executor=None):
+    """
+    Return the normalized set of addresses that belong to the authenticated user
+
+    Combines the account address from users.getProfile with every send-as
+    alias, so replies can be told apart from our own messages.
+    """
+    def run(request):
+        return executor.execute(request) if executor else request.execute()
+
+    profile = run(service.users().getProfile(userId='me'))
+    addresses = {normalize_address(profile.get('emailAddress'))}
+
+    aliases = run(service.users().settings().sendAs().list(userId='me'))
+    for alias in aliases.get('sendAs', []):
+        addresses.add(normalize_address(alias.get('sendAsEmail')))
+
+    addresses.discard('')
+    return addresses
+
+
+def is_own_message(msg, own_addresses):
+    """Check if a thread message was sent by us (SENT label or one of our addresses in From)"""
+    if 'SENT' in msg.get('labelIds', []):
+        return True
+    from_address = normalize_address(header_dict(msg['payload']).get('from'))
+    return from_address in own_addresses
+
+
+def thread_sent_since(thread, timestamp):
+    """Check whether a thread has a message we sent at or after a Unix timestamp"""
+    cutoff_ms = (timestamp - SEND_CLOCK_SKEW_SECONDS) * 1000
+    return any('SENT' in msg.get('labelIds', []) and int(msg.get('internalDate', 0)) >= cutoff_ms
+               for msg in thread.get('messages', []))
+
+
+def create_drafts(service, messages, batch_size=DEFAULT_BATCH_SIZE, batch_uri=None, executor=None):
+    """
+    Create a Gmail draft for each messages.send body, using batch requests
+
+    Returns:
+        List of (draft_id, exception) tuples in the order of messages;
+        draft_id is None where the call failed
+    """
+    results = execute_batched(
+        service,
+        [(str(idx), service.users().drafts().create(userId='me', body={'message': message}))
+         for idx, message in enumerate(messages)],
+        batch_size,
+        batch_uri,
+        executor
+    )
+
+    drafts = []
+    for idx in range(len(messages)):
+        response, exception = results.get(str(idx), (None, None))
+        drafts.append(((response or {}).get('id'), exception))
+    return drafts
+
+
+def list_draft_ids(service, executor=None):
+    """Return the IDs of every draft currently in the mailbox"""
+    return {draft['id'] for draft in iter_list_pages(
+        service.users().drafts().list,
+        'drafts',
+        executor=executor,
+        userId='me',
+        maxResults=500
+    )}
+
+
+def build_inbound_query(after, own_addresses=(), subject_keywords=None):
+    """
+    Build the search for messages someone else wrote after `after` (YYYY/MM/DD)
+
+    Messages from any of own_addresses are excluded as well as SENT ones, the
+    same test is_own_message applies to fetched threads, so a copy of our own
+    message delivered to the inbox (e.g. through an alias) is not a reply.
+    subject_keywords narrows the search like the sent search; replies keep
+    the original subject, and Gmail starts a new thread when it changes.
+    """
+    query = f'{INBOUND_QUERY} after:{after}'
+    for address in sorted(own_addresses):
+        query += f' -from:{address}'
+    if subject_keywords:
+        keyword_query = ' OR '.join([f'subject:{kw}' for kw in subject_keywords])
+        query += f' ({keyword_query})'
+    return query
+
+
+def list_inbound_threads(service, after, executor=None, own_addresses=(), subject_keywords=None):
+    """
+    Return the IDs of threads with a message we did not write, dated after `after` (YYYY/MM/DD)
+
+    Spam and trash are included, matching a threads.get reply check. See
+    build_inbound_query for own_addresses and subject_keywords.
+    """
+    return {msg['threadId'] for msg in iter_list_pages(
+        service.users().messages().list,
+        'messages',
+        executor=executor,
+        userId='me',
+        q=build_inbound_query(after, own_addresses, subject_keywords),
+        includeSpamTrash=True,
+        maxResults=500
+    )}
+
+
+def plan_reply_check(msg, inbound_threads):
+    """
+    Decide from search results alone whether a sent thread has a reply
+
+    msg must be the latest sent message in its thread. Returns False when no
+    one else wrote in the thread during the search window, True when someone
+    did and our message started the thread (Gmail gives a thread the ID of
+    its first message, so everything inbound came after it), and None when
+    only fetching the thread can tell.
+    """
+    if msg['threadId'] not in inbound_threads:
+        return False
+    if msg['id'] == msg['threadId']:
+        return True
+    return None
+
+
+def get_history_id(service, executor=None):
+    """Return the mailbox's current historyId"""
+    request = service.users().getProfile(userId='me')
+    profile = executor.execute(request) if executor else request.execute()
+    return profile['historyId']
+
+
+def list_changed_threads(service, start_history_id, executor=None):
+    """
+    Return the IDs of threads that changed since start_history_id
+
+    Returns None if Gmail no longer has history that far back (HTTP 404),
+    in which case every thread has to be treated as changed.
+    """
+    changed = set()
+    try:
+        for record in iter_list_pages(
+            service.users().history().list,
+            'history',
+            executor=executor,
+            userId='me',
+            startHistoryId=start_history_id,
+            maxResults=500
+        ):
+            for msg in record.get('messages', []):
+                changed.add(msg['threadId'])
+    except HttpError as e:
+        if e.resp.status == 404:
+            return None
+        raise
+
+    return changed
@@ -0,0 +1,128 @@
+"""
+Raw follow-up message construction
+Turns prepared follow-ups into Gmail-ready raw payloads in bulk, separately
+from sending, with In-Reply-To/References taken from the original message.
+Plain-text messages are written straight to RFC 5322 text, so no MIME
+object or generator is built per message
+"""
+
+import base64
+from email.charset import Charset, BASE64
+from email.header import Header
+from email.utils import formataddr, getaddresses
+
+CRLF = '\r\n'
+
+# Longest line SMTP allows; bodies with longer lines are base64-encoded
+MAX_LINE_LENGTH = 998
+
+# Shared charset for non-ASCII bodies and headers
+UTF8 = Charset('utf-8')
+UTF8.body_encoding = BASE64
+
+
+def reply_subject(subject):
+    """Return the subject with a single 'Re:' prefix"""
+    subject = subject or ''
+    return subject if subject[:3].lower() == 're:' else f'Re: {subject}'
+
+
+def threading_headers(message_id, references=None):
+    """Return (In-Reply-To, References) for a reply to the message with this Message-ID"""
+    if not message_id:
+        return None, None
+    references = f"{references} {message_id}" if references else message_id
+    return message_id, references
+
+
+def fold_ids(ids):
+    """Fold a space-separated list of message IDs, one per line, so long reply chains stay under MAX_LINE_LENGTH"""
+    return (CRLF + ' ').join(ids.split())
+
+
+def encode_header(value):
+    """Return a header value, RFC 2047-encoded if it isn't ASCII"""
+    if value.isascii():
+        return value
+    return Header(value, UTF8, header_name='Subject').encode(linesep=CRLF)
+
+
+def encode_address(address):
+    """
+    Return an email address in ASCII, IDNA-encoding an internationalized domain
+
+    Raises ValueError if the local part isn't ASCII, which plain headers can't carry.
+    """
+    if address.isascii():
+        return address
+    local, at, domain = address.rpartition('@')
+    if at and not domain.isascii():
+        domain = domain.encode('idna').decode('ascii')
+    address = f"{local}{at}{domain}"
+    if not address.isascii():
+        raise ValueError(f"Can't encode the non-ASCII address {address!r}")
+    return address
+
+
+def encode_address_header(value):
+    """Return an address header value, encoding the display names and domains that aren't ASCII"""
+    if value.isascii():
+        return value
+    return ', '.join(formataddr((name, encode_address(address)), charset=UTF8)
+                     for name, address in getaddresses([value]))
+
+
+def encode_body(body):
+    """Return (charset, transfer encoding, encoded text) for a plain-text body"""
+    lines = body.splitlines()
+    if body.isascii() and all(len(line) <= MAX_LINE_LENGTH for line in lines):
+        return 'us-ascii', '7bit', CRLF.join(lines)
+    return 'utf-8', 'base64', base64.encodebytes(body.encode('utf-8')).decode('ascii').replace('\n', CRLF).rstrip()
+
+
+def build_raw(to, subject, body, message_id=None, references=None):
+    """Return the base64url-encoded RFC 5322 text of a plain-text reply"""
+    in_reply_to, references = threading_headers(message_id, references)
+    charset, transfer_encoding, text = encode_body(body)
+
+    headers = [f"To: {encode_address_header(to)}", f"Subject: {encode_header(reply_subject(subject))}"]
+    if in_reply_to:
+        headers += [f"In-Reply-To: {in_reply_to}", f"References: {fold_ids(references)}"]
+    headers += [
+        'MIME-Version: 1.0',
+        f'Content-Type: text/plain; charset="{charset}"',
+        f'Content-Transfer-Encoding: {transfer_encoding}',
+    ]
+
+    # One encode from str to bytes and one base64 pass per message
+    message = CRLF.join(headers) + CRLF + CRLF + text + CRLF
+    return base64.urlsafe_b64encode(message.encode('ascii')).decode('ascii')
+
+
+def build_message(to, subject, body, thread_id, message_id=None, references=None):
+    """Return the messages.send body for a follow-up in an existing thread"""
+    return {
+        'raw': build_raw(to, subject, body, message_id, references),
+        'threadId': thread_id,
+    }
+
+
+def build_messages(drafts):
+    """
+    Build the messages.send bodies for many prepared follow-ups
+
+    Each draft is an email details dict with 'to', 'subject', 'thread_id' and
+    'followup_body', plus the original's 'message_id' and 'references' when
+    known. Returns (message, error) tuples in the same order; message is None
+    where the draft can't be encoded (e.g. a non-ASCII address), so one bad
+    recipient doesn't stop the rest.
+    """
+    results = []
+    for draft in drafts:
+        try:
+            results.append((build_message(draft['to'], draft['subject'], draft['followup_body'], draft['thread_id'],
+                                          draft.get('message_id'), draft.get('references')), None))
+        except ValueError as e:
+            # UnicodeError, e.g. from an invalid IDNA label, is a ValueError too
+            results.append((None, e))
+    return results
@@ -0,0 +1,171 @@
+"""
+Campaign metrics
+Thread-safe counters, timers and latency histograms, written out as JSON
+lines or a Prometheus text file
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# Bucket upper bounds for per-request token counts
+TOKEN_BUCKETS = (50, 100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 4000, float('inf'))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class Metrics:
+    """
+    Registry of counters and histograms for one campaign run
+
+    Metric names follow Prometheus conventions (``_total`` for counters,
+    ``_seconds`` for timings) and take optional labels as keyword arguments:
+
+        metrics.inc('gmail_requests_total', method='gmail.users.threads.get')
+        with metrics.stage('send'):
+            ...
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Record one value, usually a duration in seconds, in a histogram (buckets apply on first use)"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time the enclosed block into a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage):
+        """Time one campaign stage (listing, analysis, generation, sending, ...)"""
+        return self.timer('campaign_stage_seconds', stage=stage)
+
+    def stage_seconds(self):
+        """Return the total time spent in each stage"""
+        with self._lock:
+            return {dict(labels)['stage']: round(h.sum, 3) for (name, labels), h in self.histograms.items()
+                    if name == 'campaign_stage_seconds'}
+
+    def snapshot(self):
+        """Return every metric as plain JSON-serializable data"""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{
+                'name': name,
+                'labels': dict(labels),
+                'count': h.count,
+                'sum': round(h.sum, 6),
+                'max': round(h.max, 6),
+                'p50': round(h.quantile(0.5), 6),
+                'p95': round(h.quantile(0.95), 6),
+            } for (name, labels), h in sorted(self.histograms.items())]
+
+        return {'timestamp': time.time(), 'elapsed_seconds': round(time.time() - self.started, 3),
+                'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        def fmt_labels(labels, extra=()):
+            pairs = [f'{k}="{str(v)}"' for k, v in list(labels) + list(extra)]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f'# TYPE {name} counter')
+                    seen.add(name)
+                lines.append(f'{name}{fmt_labels(labels)} {value}')
+
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in seen:
+                    lines.append(f'# TYPE {name} histogram')
+                    seen.add(name)
+                for bound, count in zip(h.buckets, h.cumulative_counts()):
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{fmt_labels(labels, [("le", le)])} {count}')
+                lines.append(f'{name}_sum{fmt_labels(labels)} {h.sum}')
+                lines.append(f'{name}_count{fmt_labels(labels)} {h.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Write the metrics to path
+
+        Paths ending in .prom are overwritten with Prometheus text (for the
+        node_exporter textfile collector); anything else gets one JSON line
+        appended per run.
+        """
+        if path.endswith('.prom'):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.snapshot()) + '\n')
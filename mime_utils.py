@@ -0,0 +1,243 @@
+"""
+Body text extraction from Gmail message payloads
+Walks nested MIME parts, decodes only as much of the chosen part as the
+caller needs, converts HTML to text and drops quoted replies
+"""
+
+import base64
+import binascii
+import codecs
+import html
+import re
+
+# Deepest MIME nesting we follow; real mail rarely goes past 3-4 levels
+MAX_MIME_DEPTH = 10
+
+# Characters of body text the agents keep for prompts
+DEFAULT_BODY_CHARS = 1000
+
+# First guess at how many HTML bytes yield one character of text; doubled until enough text is found
+HTML_BYTES_PER_CHAR = 8
+
+BLOCK_TAGS_RE = re.compile(r'<(script|style|head|title)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+# Opens a block or comment; once complete ones are removed, any match left is unclosed
+BLOCK_OPEN_RE = re.compile(r'<(?:script|style|head|title)\b|<!--', re.IGNORECASE)
+LINE_BREAK_TAGS_RE = re.compile(r'<\s*(br|/p|/div|/tr|/li|/h[1-6]|/table|/blockquote)\b[^>]*>', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]*>')
+SPACES_RE = re.compile(r'[ \t\r\f\v\xa0]+')
+BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+
+# Lines that start the quoted message in a reply ("On Mon, ... wrote:", Outlook headers, ...)
+QUOTE_HEADER_RE = re.compile(
+    r'^[ \t]*(On\s[^\n]{0,200}(\n[^\n]{0,200})?\swrote:[ \t]*$'
+    r'|-{2,}[ \t]*Original Message[ \t]*-{2,}'
+    r'|_{10,}[ \t]*$'
+    r'|From:[ \t][^\n]+\n[ \t]*(Sent|Date):[ \t])',
+    re.IGNORECASE | re.MULTILINE
+)
+QUOTED_LINE_RE = re.compile(r'^\s*>.*\n?', re.MULTILINE)
+
+# Where a signature starts: the "-- " delimiter, mobile footers, or a sign-off line near the end
+SIGNATURE_DELIMITER_RE = re.compile(r'^[ \t]*--[ \t]*$', re.MULTILINE)
+MOBILE_FOOTER_RE = re.compile(r'^[ \t]*(Sent from my |Get Outlook for )', re.IGNORECASE | re.MULTILINE)
+SIGN_OFF_RE = re.compile(
+    r'^[ \t]*((best|kind|warm|warmest)( regards| wishes)?|regards|thanks( again| so much)?|thank you'
+    r'|many thanks|cheers|sincerely|yours( truly| sincerely)?|all the best)[ \t]*[,.!]?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+GREETING_RE = re.compile(r'^\s*(hi|hello|hey|dear|good (morning|afternoon|evening))\b[^\n]{0,40}\n', re.IGNORECASE)
+SIGN_OFF_LINES = 6
+SENTENCE_END_RE = re.compile(r'[.!?](\s|$)')
+
+# Characters of the original email that go into a generation prompt
+PROMPT_EXCERPT_CHARS = 400
+CHARSET_RE = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+
+
+def is_attachment(part):
+    """Check whether a MIME part is an attachment rather than body text"""
+    body = part.get('body', {})
+    return bool(part.get('filename') or body.get('attachmentId'))
+
+
+def find_text_parts(payload, max_depth=MAX_MIME_DEPTH):
+    """
+    Return the (text/plain, text/html) parts that hold the message body
+
+    Parts are visited depth-first in document order down to max_depth, so the
+    text inside multipart/alternative nested in multipart/mixed is found.
+    Attachments, including text/* files and forwarded messages, are skipped.
+    Either part may be None.
+    """
+    plain = html_part = None
+    stack = [(payload, 0)]
+
+    while stack and plain is None:
+        part, depth = stack.pop()
+        mime_type = part.get('mimeType', '').lower()
+
+        if mime_type.startswith('multipart/'):
+            if depth < max_depth:
+                # Reversed so the first child is visited first
+                stack.extend((child, depth + 1) for child in reversed(part.get('parts', [])))
+        elif is_attachment(part) or mime_type == 'message/rfc822':
+            continue
+        elif mime_type == 'text/plain':
+            plain = part
+        elif mime_type == 'text/html' and html_part is None:
+            html_part = part
+
+    return plain, html_part
+
+
+def decode_prefix(data, max_bytes=None):
+    """
+    Decode the start of a base64url part body
+
+    Only the base64 characters needed for max_bytes are decoded, so a large
+    part is never decoded in full. Returns the bytes and whether data remains.
+    """
+    if max_bytes is None or len(data) * 3 // 4 <= max_bytes:
+        chunk, more = data, False
+    else:
+        # Whole 4-character groups keep the prefix valid base64
+        chunk, more = data[:(max_bytes + 2) // 3 * 4], True
+
+    try:
+        return base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4)), more
+    except (binascii.Error, ValueError):
+        return b'', False
+
+
+def html_to_text(markup):
+    """Convert an HTML document to readable plain text"""
+    text = BLOCK_TAGS_RE.sub('', markup)
+    text = COMMENT_RE.sub('', text)
+    text = LINE_BREAK_TAGS_RE.sub('\n', text)
+    text = TAG_RE.sub('', text)
+    text = html.unescape(text)
+    return normalize_whitespace(text)
+
+
+def normalize_whitespace(text):
+    text = SPACES_RE.sub(' ', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+def strip_quoted_reply(text):
+    """Drop the quoted earlier message from a reply, keeping only what was newly written"""
+    match = QUOTE_HEADER_RE.search(text)
+    if match:
+        text = text[:match.start()]
+    return QUOTED_LINE_RE.sub('', text).strip()
+
+
+def strip_signature(text):
+    """Drop the sign-off and signature block from the end of a message"""
+    match = SIGNATURE_DELIMITER_RE.search(text) or MOBILE_FOOTER_RE.search(text)
+    if match:
+        text = text[:match.start()]
+
+    # A sign-off only counts near the end, so "Thanks," opening a paragraph survives
+    lines = text.rstrip().split('\n')
+    tail_start = len('\n'.join(lines[:-SIGN_OFF_LINES])) if len(lines) > SIGN_OFF_LINES else 0
+    match = SIGN_OFF_RE.search(text, tail_start)
+    if match:
+        text = text[:match.start()]
+    return text.strip()
+
+
+def prompt_excerpt(text, max_chars=PROMPT_EXCERPT_CHARS):
+    """
+    Return the part of an email body worth putting in a prompt
+
+    Quoted replies, the greeting and the signature are removed and the rest
+    is joined onto one line, cut at a sentence end when it is too long.
+    """
+    text = strip_signature(strip_quoted_reply(text or ''))
+    text = GREETING_RE.sub('', text, count=1)
+    text = ' '.join(text.split())
+    if len(text) <= max_chars:
+        return text
+
+    cut = text[:max_chars]
+    sentence_ends = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] >= max_chars // 2:
+        return cut[:sentence_ends[-1]].strip()
+    return cut.rsplit(' ', 1)[0] + '...'
+
+
+def part_charset(part):
+    """Return the part's declared charset, or utf-8 if it is missing or unknown"""
+    for header in part.get('headers', []):
+        if header['name'].lower() == 'content-type':
+            match = CHARSET_RE.search(header['value'])
+            if match:
+                try:
+                    return codecs.lookup(match.group(1)).name
+                except LookupError:
+                    break
+    return 'utf-8'
+
+
+def part_text(part, max_chars, is_html, strip_quotes):
+    """Decode a text part, reading more of it only while the text is still short of max_chars"""
+    data = part.get('body', {}).get('data', '')
+    if not data:
+        return ''
+
+    charset = part_charset(part)
+    # UTF-8 needs at most 4 bytes per character; HTML needs room for its markup too
+    budget = max_chars * (HTML_BYTES_PER_CHAR if is_html else 4) if max_chars else None
+
+    while True:
+        raw, more = decode_prefix(data, budget)
+        text = raw.decode(charset, errors='ignore')
+        if is_html:
+            if more:
+                # Drop a tag cut off at the end of the prefix
+                cut = text.rfind('<')
+                if cut > text.rfind('>'):
+                    text = text[:cut]
+                # Drop a style/script/head block or comment still open at the end of the prefix,
+                # so its contents are not read as text; the budget grows until it closes
+                text = COMMENT_RE.sub('', BLOCK_TAGS_RE.sub('', text))
+                opened = BLOCK_OPEN_RE.search(text)
+                if opened:
+                    text = text[:opened.start()]
+            text = html_to_text(text)
+        else:
+            text = normalize_whitespace(text)
+
+        full_length = len(text)
+        if strip_quotes:
+            text = strip_quoted_reply(text)
+
+        # Stop once there is enough text, or the quoted part has started and the rest is quote
+        if not more or full_length >= max_chars or len(text) < full_length:
+            return text[:max_chars] if max_chars else text
+        budget *= 2
+
+
+def extract_body_text(payload, max_chars=DEFAULT_BODY_CHARS, strip_quotes=True, max_depth=MAX_MIME_DEPTH):
+    """
+    Return up to max_chars of a message's body text
+
+    Prefers the text/plain part and falls back to converting text/html.
+    Quoted replies are removed when strip_quotes is set. Pass max_chars=None
+    to decode the whole body.
+
+    Args:
+        payload: Gmail message payload from a 'full' format fetch
+        max_chars: Characters of text to return (None for all)
+        strip_quotes: Drop quoted earlier messages from replies
+        max_depth: Deepest MIME nesting to search
+    """
+    plain, html_part = find_text_parts(payload, max_depth)
+    if plain is not None:
+        return part_text(plain, max_chars, False, strip_quotes)
+    if html_part is not None:
+        return part_text(html_part, max_chars, True, strip_quotes)
+    return ''
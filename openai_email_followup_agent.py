@@ -5,258 +5,342 @@ Automatically sends follow-up emails to recipients who haven't replied
 """
 
 import os
-import base64
+import logging
+import json
+import tempfile
 import time
-import re
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 
-# Gmail API scopes
-SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+from gmail_campaign import GmailCampaignMixin
+from gmail_client import (
+    chunked, execute_batched, header_dict, TokenBucket, DEFAULT_BATCH_SIZE, DEFAULT_SENDS_PER_SECOND,
+    FETCH_PROFILES, GMAIL_QUOTA_UNITS_PER_SECOND
+)
+from message_builder import build_message
+from metrics import Metrics, TOKEN_BUCKETS
+from mime_utils import extract_body_text, prompt_excerpt, DEFAULT_BODY_CHARS
+from recipients import display_name, parse_recipients, thread_activity, FOLLOWUP_WINDOW_DAYS
+from state_store import GenerationCache, Outbox
+from template_engine import load_templates, TEMPLATES_DIR
+
+logger = logging.getLogger(__name__)
 
 # Get OpenAI API key from environment variable
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
-class OpenAIEmailFollowupAgent:
-    def __init__(self, use_ai=True):
+# Static instructions, sent byte-for-byte identical as the system message of every
+# request so the provider can cache the prefix; the per-email details follow it
+FOLLOWUP_SYSTEM_PROMPT = """You write short, natural second emails to people who haven't answered an earlier \
+professional email. You get the recipient, their first name, the subject and the main part of the original email.
+
+Rules:
+- Greet by first name if known, otherwise "Hi,"
+- Never say "follow-up" or "following up"; it should read as a natural second email, not a reminder
+- Reference the original topic naturally
+- 3-4 sentences, warm, genuine and human, not robotic
+- End with a simple question or call to action
+- No signature (I'll add that)
+
+Write ONLY the email body, nothing else."""
+
+# Recipients packed into one request by generate_followups_grouped
+DEFAULT_GROUP_SIZE = 10
+
+# Appended to the system prompt for grouped requests; the reply must match GROUP_RESPONSE_FORMAT
+GROUP_INSTRUCTIONS = """
+
+You get several emails at once, each starting with an "id:" line. Write a separate email for every id, \
+personal to that recipient, and return them all in "followups"."""
+
+GROUP_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "followups",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "followups": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"id": {"type": "string"}, "body": {"type": "string"}},
+                        "required": ["id", "body"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["followups"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Longest body accepted from a grouped reply; the instructions ask for 3-4 sentences
+MAX_GROUPED_BODY_CHARS = 1500
+
+class OpenAIEmailFollowupAgent(GmailCampaignMixin):
+    def __init__(self, use_ai=True, batch_uri=None, quota_units_per_sec=GMAIL_QUOTA_UNITS_PER_SECOND,
+                 sends_per_sec=DEFAULT_SENDS_PER_SECOND, generation_cache=None, tokens_per_minute=None,
+                 openai_api_key=None, openai_base_url=None, token_path='token.pickle',
+                 credentials_path='credentials.json', gmail_api_endpoint=None, metrics_path=None,
+                 templates_dir=TEMPLATES_DIR):
         self.service = None
-        self.use_ai = use_ai and OPENAI_API_KEY
+        self.session = None
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.gmail_api_endpoint = gmail_api_endpoint
+        self.metrics = Metrics()
+        self.metrics_path = metrics_path
+        # Optional on-disk cache so previews, dry runs and re-runs reuse one generated draft
+        self.generation_cache = GenerationCache(generation_cache) if generation_cache else None
+        self.gmail = None
+        self.quota_units_per_sec = quota_units_per_sec
+        self.send_limiter = TokenBucket(sends_per_sec, capacity=1)
+        self.batch_uri = batch_uri
+        self.state_store = None
+        self.changed_threads = None
+        self.outbox = None
+        self.draft_store = None
+        self.own_addresses = None
+        self.recipient_index = None
+        self.recipient_policy = {}
+        self.planned_replies = 0
+        # Template bodies for template mode and for AI fallbacks
+        self.templates = load_templates(templates_dir)
+        
+        # Optional OpenAI token-per-minute budget shared by all generation workers
+        self.token_limiter = None
+        if tokens_per_minute:
+            self.token_limiter = TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute / 6)
+        
+        api_key = openai_api_key or OPENAI_API_KEY
+        self.use_ai = use_ai and api_key
         
         if self.use_ai:
-            self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-            print("✓ AI mode enabled (OpenAI GPT-4)")
+            # base_url lets the agent talk to any OpenAI-compatible server, e.g. a local mock
+            self.openai_client = OpenAI(api_key=api_key, base_url=openai_base_url)
+            logger.info("✓ AI mode enabled (OpenAI GPT-4)")
         else:
-            print("⚠️  AI mode disabled (using templates)")
-            if not OPENAI_API_KEY:
-                print("   Set OPENAI_API_KEY to enable AI generation")
+            logger.warning("⚠️  AI mode disabled (using templates)")
+            if not api_key:
+                logger.info("   Set OPENAI_API_KEY to enable AI generation")
         
         self.authenticate()
     
-    def authenticate(self):
-        """Authenticate with Gmail API"""
-        creds = None
-        
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
-        
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-            
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-        
-        self.service = build('gmail', 'v1', credentials=creds)
-        print("✓ Successfully authenticated with Gmail")
-    
     def extract_name_from_email(self, email_address):
-        """Extract name from email address"""
-        name_match = re.search(r'^([^<]+)<', email_address)
-        if name_match:
-            name = name_match.group(1).strip()
-            name = name.replace('"', '').replace("'", '')
-            return name
-        
-        email_parts = email_address.split('@')[0]
-        name_parts = re.split(r'[._-]', email_parts)
-        name = ' '.join([part.capitalize() for part in name_parts if len(part) > 1])
-        
-        return name if name else None
+        """Extract the first recipient's name from a header value (memoized)"""
+        recipients = parse_recipients(email_address)
+        return display_name(*recipients[0]) if recipients else None
     
-    def get_email_body(self, message):
-        """Extract email body text from message"""
+    def get_email_body(self, message, max_chars=DEFAULT_BODY_CHARS):
+        """Extract up to max_chars of body text, searching nested MIME parts"""
         try:
-            if 'parts' in message['payload']:
-                parts = message['payload']['parts']
-                for part in parts:
-                    if part['mimeType'] == 'text/plain':
-                        data = part['body'].get('data', '')
-                        if data:
-                            return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                    elif part['mimeType'] == 'text/html':
-                        data = part['body'].get('data', '')
-                        if data:
-                            html = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                            text = re.sub('<[^<]+?>', '', html)
-                            return text
-            else:
-                data = message['payload']['body'].get('data', '')
-                if data:
-                    return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-        except Exception as e:
-            pass
-        
-        return ""
+            return extract_body_text(message['payload'], max_chars)
+        except Exception:
+            return ""
     
-    def find_sent_emails(self, days_ago=7, subject_keywords=None):
-        """Find emails you sent"""
-        print(f"\n🔍 Searching for emails sent in the last {days_ago} days...")
+    def analyze_thread(self, thread, original_msg_id):
+        """Get (details, has_reply) for the original message from one fetched thread"""
+        original = next((msg for msg in thread.get('messages', []) if msg['id'] == original_msg_id), None)
+        if not original:
+            return None, False
         
-        date_filter = (datetime.now() - timedelta(days=days_ago)).strftime('%Y/%m/%d')
-        query = f'in:sent after:{date_filter}'
+        # Threads are fetched as metadata - bodies are loaded only when needed for AI generation
+        details = self.parse_email_details(original, include_body=False)
+        has_reply = self.thread_has_reply(thread, original_msg_id)
         
-        if subject_keywords:
-            keyword_query = ' OR '.join([f'subject:{kw}' for kw in subject_keywords])
-            query += f' ({keyword_query})'
+        # Kept with the details so later runs can index the thread without fetching it
+        details['repliers'], details['followup_times'] = thread_activity(thread, self.get_own_addresses())
+        if self.recipient_index is not None:
+            self.recipient_index.add_details(details, has_reply)
         
-        try:
-            results = self.service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=500
-            ).execute()
-            
-            messages = results.get('messages', [])
-            print(f"✓ Found {len(messages)} sent emails")
-            return messages
+        if self.state_store is not None:
+            self.state_store.save_thread(thread['id'], original_msg_id, thread.get('historyId'), has_reply, details)
         
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            return []
+        return details, has_reply
     
-    def check_for_reply(self, thread_id, original_msg_id):
-        """Check if thread has replies"""
+    def check_thread(self, thread_id, original_msg_id):
+        """Fetch a thread once and return (details, has_reply) for the original message"""
         try:
-            thread = self.service.users().threads().get(
+            thread = self.gmail.execute(self.service.users().threads().get(
                 userId='me',
-                id=thread_id
-            ).execute()
-            
-            messages = thread.get('messages', [])
-            
-            original_timestamp = None
-            for msg in messages:
-                if msg['id'] == original_msg_id:
-                    original_timestamp = int(msg['internalDate'])
-                    break
-            
-            if not original_timestamp:
-                return False
-            
-            for msg in messages:
-                msg_timestamp = int(msg['internalDate'])
-                if msg_timestamp > original_timestamp:
-                    headers = msg['payload']['headers']
-                    from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), '')
-                    
-                    if 'me' not in from_header.lower():
-                        return True
+                id=thread_id,
+                **FETCH_PROFILES['metadata']
+            ))
             
-            return False
-        except:
-            return False
+            return self.analyze_thread(thread, original_msg_id)
+        
+        except Exception as e:
+            logger.error(f"❌ Error checking thread: {e}")
+            self.metrics.inc('analysis_errors_total', stage='thread')
+            return None, False
     
-    def get_email_details(self, message_id):
-        """Get detailed email information"""
+    def get_email_details(self, message_id, include_body=True):
+        """Get detailed email information; include_body=False fetches headers only"""
         try:
-            message = self.service.users().messages().get(
+            message = self.gmail.execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
-                format='full'
-            ).execute()
-            
-            headers = message['payload']['headers']
-            
-            subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-            to = next((h['value'] for h in headers if h['name'].lower() == 'to'), '')
-            thread_id = message['threadId']
+                **FETCH_PROFILES['full' if include_body else 'metadata']
+            ))
             
-            body = self.get_email_body(message)
-            
-            recipient_name = self.extract_name_from_email(to)
-            recipient_email = to.split('<')[-1].replace('>', '').strip() if '<' in to else to.strip()
-            
-            return {
-                'id': message_id,
-                'thread_id': thread_id,
-                'subject': subject,
-                'to': to,
-                'recipient_name': recipient_name,
-                'recipient_email': recipient_email,
-                'body': body[:1000],
-                'snippet': message.get('snippet', ''),
-            }
+            return self.parse_email_details(message, include_body=include_body)
         
         except Exception as e:
+            logger.error(f"❌ Error getting email details: {e}")
+            self.metrics.inc('analysis_errors_total', stage='message')
             return None
     
-    def generate_ai_followup(self, recipient_name, subject, original_body):
-        """Generate personalized follow-up using OpenAI GPT-4"""
+    def parse_email_details(self, message, include_body=True):
+        """
+        Extract detailed email information from a fetched message resource
+        
+        With include_body=False (metadata fetches) 'body' is None until
+        load_email_body fetches it.
+        """
+        headers = header_dict(message['payload'])
+        
+        subject = headers.get('subject', 'No Subject')
+        to = headers.get('to', '')
+        thread_id = message['threadId']
         
+        body = self.get_email_body(message) if include_body else None
+        
+        # The first To address is the person the follow-up greets; Cc'd people count for the index
+        recipients = parse_recipients(to, headers.get('cc', ''))
+        recipient_name, recipient_email = (display_name(*recipients[0]), recipients[0][1]) if recipients \
+            else (None, to.strip())
+        
+        return {
+            'id': message['id'],
+            'thread_id': thread_id,
+            'subject': subject,
+            'to': to,
+            'recipient_name': recipient_name,
+            'recipient_email': recipient_email,
+            'recipients': [address for _, address in recipients],
+            'body': body,
+            'snippet': message.get('snippet', ''),
+            # Threading headers for the follow-up
+            'message_id': headers.get('message-id'),
+            'references': headers.get('references'),
+        }
+    
+    def describe_email(self, recipient_name, subject, original_body, include_subject=True):
+        """Return the per-email lines of a generation prompt"""
         first_name = recipient_name.split()[0] if recipient_name and ' ' in recipient_name else recipient_name
         
-        prompt = f"""You are helping write a professional follow-up email. 
-
-Original email details:
-- Recipient: {recipient_name or "Unknown"}
-- Subject: {subject}
-- Original message preview: {original_body[:500]}
-
-Requirements:
-1. Write a natural, warm follow-up email
-2. Use the recipient's first name ({first_name}) if available, otherwise use "Hi,"
-3. DO NOT use the word "follow-up" or "following up" 
-4. Reference the original topic naturally
-5. Keep it brief (3-4 sentences max)
-6. Sound genuine and human, not robotic
-7. End with a simple question or call to action
-8. Don't include a signature (I'll add that)
-9. Make it sound like a natural second email, not a reminder
-
-Write ONLY the email body, nothing else."""
-
+        lines = [f"Recipient: {recipient_name or 'Unknown'}", f"First name: {first_name or 'unknown'}"]
+        if include_subject:
+            lines.append(f"Subject: {subject}")
+        lines.append(f"Original email: {prompt_excerpt(original_body)}")
+        return '\n'.join(lines)
+    
+    def build_followup_request(self, recipient_name, subject, original_body):
+        """Build the chat.completions request body for one follow-up"""
+        
+        # Only these few lines change between emails; the instructions are the shared system prefix
+        prompt = self.describe_email(recipient_name, subject, original_body)
+        
+        return {
+            "model": "gpt-4o",  # Using GPT-4o (fastest and most cost-effective)
+            "messages": [
+                {"role": "system", "content": FOLLOWUP_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 200,
+            "temperature": 0.8
+        }
+    
+    def request_ai_followup(self, recipient_name, subject, original_body):
+        """Call OpenAI for a personalized follow-up body (raises on API errors)"""
+        request = self.build_followup_request(recipient_name, subject, original_body)
+        return self.create_completion(request)
+    
+    def create_completion(self, request):
+        """Send one chat.completions request within the token budget and return the text (raises on API errors)"""
+        if self.token_limiter:
+            # Rough estimate: ~4 characters per prompt token, plus the completion budget
+            prompt_chars = sum(len(m["content"]) for m in request["messages"])
+            waited = self.token_limiter.acquire(prompt_chars // 4 + request["max_tokens"])
+            self.metrics.observe('rate_limit_wait_seconds', waited, limiter='openai')
+        
+        self.metrics.inc('openai_requests_total')
+        with self.metrics.timer('openai_request_seconds'):
+            response = self.openai_client.chat.completions.create(**request)
+        self.record_usage(response.usage)
+        
+        return response.choices[0].message.content.strip()
+    
+    def record_usage(self, usage):
+        """Count the prompt, cached prompt and completion tokens reported by OpenAI for one request"""
+        if not usage:
+            return
+        if isinstance(usage, dict):
+            prompt_tokens, completion_tokens = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+            cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+        else:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+            cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0)
+        self.metrics.inc('openai_tokens_total', prompt_tokens or 0, type='prompt')
+        self.metrics.inc('openai_tokens_total', cached_tokens or 0, type='cached_prompt')
+        self.metrics.inc('openai_tokens_total', completion_tokens or 0, type='completion')
+        self.metrics.observe('openai_prompt_tokens', prompt_tokens or 0, buckets=TOKEN_BUCKETS)
+    
+    def load_email_body(self, email_details):
+        """Fetch the original body for an email analyzed from metadata only"""
+        if email_details.get('body') is not None:
+            return email_details['body']
+        
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",  # Using GPT-4o (fastest and most cost-effective)
-                messages=[
-                    {"role": "system", "content": "You are an expert at writing natural, personalized professional emails."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.8
-            )
-            
-            return response.choices[0].message.content.strip()
+            message = self.gmail.execute(self.service.users().messages().get(
+                userId='me',
+                id=email_details['id'],
+                **FETCH_PROFILES['full']
+            ))
+            email_details['body'] = self.get_email_body(message)
+        except Exception as e:
+            logger.warning(f"  ⚠️  Could not fetch original body: {e}")
+            email_details['body'] = ''
+        
+        return email_details['body']
+    
+    def load_email_bodies(self, emails, batch_size=DEFAULT_BATCH_SIZE):
+        """Fetch original bodies for many emails with Gmail batch requests"""
+        missing = [email for email in emails if email.get('body') is None]
+        if not missing:
+            return
+        
+        messages_api = self.service.users().messages()
+        results = execute_batched(
+            self.service,
+            [(email['id'], messages_api.get(userId='me', id=email['id'], **FETCH_PROFILES['full']))
+             for email in missing],
+            batch_size=batch_size,
+            batch_uri=self.batch_uri,
+            executor=self.gmail
+        )
+        
+        for email in missing:
+            message, error = results.get(email['id'], (None, None))
+            email['body'] = self.get_email_body(message) if message and not error else ''
+    
+    def generate_ai_followup(self, recipient_name, subject, original_body):
+        """Generate personalized follow-up using OpenAI GPT-4"""
+        try:
+            return self.request_ai_followup(recipient_name, subject, original_body)
         
         except Exception as e:
-            print(f"  ⚠️  AI generation failed, using template: {e}")
+            logger.warning(f"  ⚠️  AI generation failed, using template: {e}")
+            self.metrics.inc('openai_fallbacks_total')
             return self.generate_template_followup(recipient_name, subject, original_body)
     
     def generate_template_followup(self, recipient_name, subject, original_body):
         """Fallback template-based follow-up"""
-        
-        first_name = recipient_name.split()[0] if recipient_name and ' ' in recipient_name else recipient_name
-        greeting = f"Hi {first_name}," if first_name else "Hi,"
-        
-        is_job = any(word in subject.lower() for word in ['application', 'position', 'job', 'role'])
-        
-        if is_job:
-            return f"""{greeting}
-
-I hope this email finds you well. I wanted to reach out regarding the position I applied for recently.
-
-I'm still very interested in this opportunity and would love to discuss how I can contribute to your team.
-
-Would you have time for a brief conversation?"""
-        else:
-            return f"""{greeting}
-
-I hope you're doing well. I wanted to touch base on my previous email.
-
-I'd really appreciate the chance to discuss this further when you have a moment.
-
-Are you available for a quick chat?"""
+        return self.templates.render(recipient_name, subject, original_body or '')
     
     def generate_personalized_followup(self, recipient_name, subject, original_body):
         """Generate personalized follow-up (AI or template)"""
@@ -265,145 +349,611 @@ Are you available for a quick chat?"""
         else:
             return self.generate_template_followup(recipient_name, subject, original_body)
     
-    def create_followup_message(self, email_details, thread_id):
-        """Create follow-up message"""
-        body = self.generate_personalized_followup(
-            email_details['recipient_name'],
-            email_details['subject'],
-            email_details['body']
-        )
+    def get_followup_body(self, email_details):
+        """
+        Return the follow-up body for an email, generating it at most once
+        
+        The draft is kept on the email details, so preview, dry run and the real
+        send all use the same text. With a generation cache, re-runs reuse drafts
+        generated for the same original message, recipient and subject, and
+        the original body is only fetched on a cache miss.
+        """
+        if email_details.get('followup_body'):
+            return email_details['followup_body']
+        
+        cached = self.get_cached_followup(email_details)
+        if cached:
+            return cached
+        
+        if self.use_ai:
+            self.load_email_body(email_details)
+            try:
+                body = self.request_ai_followup(
+                    email_details['recipient_name'], email_details['subject'], email_details['body']
+                )
+            except Exception as e:
+                # Template fallbacks are not cached, so the next run retries the AI
+                logger.warning(f"  ⚠️  AI generation failed, using template: {e}")
+                self.metrics.inc('openai_fallbacks_total')
+                return self.attach_followup(email_details, self.generate_template_followup(
+                    email_details['recipient_name'], email_details['subject'], email_details['body']
+                ), cache=False)
+        else:
+            body = self.generate_template_followup(
+                email_details['recipient_name'], email_details['subject'], email_details['body']
+            )
+        
+        return self.attach_followup(email_details, body)
+    
+    def ensure_followup_bodies(self, emails):
+        """Generate (or load from cache) the follow-up body of every email that has none"""
+        for email in emails:
+            self.get_followup_body(email)
+    
+    def followup_recipient(self, email):
+        """Label a follow-up by the greeted name, or the address when there is none"""
+        return email['recipient_name'] or email['recipient_email']
+    
+    def get_cached_followup(self, email_details):
+        """Attach and return a cached draft for this email, or None"""
+        if not self.generation_cache:
+            return None
         
-        message = MIMEText(body)
-        message['to'] = email_details['to']
+        cached = self.generation_cache.get(self.generation_cache_key(email_details))
+        self.metrics.inc('generation_cache_lookups_total', result='hit' if cached else 'miss')
+        if cached:
+            email_details['followup_body'] = cached
+        return cached
+    
+    def attach_followup(self, email_details, body, cache=True):
+        """Keep a generated draft on the email details (and in the cache)"""
+        if cache and self.generation_cache:
+            self.generation_cache.put(self.generation_cache_key(email_details), body, email_details['thread_id'])
         
-        subject = email_details['subject']
-        if not subject.startswith('Re:'):
-            subject = f'Re: {subject}'
-        message['subject'] = subject
+        email_details['followup_body'] = body
+        return body
+    
+    def generation_cache_key(self, email_details):
+        return GenerationCache.make_key(email_details['id'], email_details['recipient_email'], email_details['subject'])
+    
+    def prepare_followups(self, emails, workers=4):
+        """
+        Generate follow-up bodies for all emails before the send phase
+        
+        Up to `workers` OpenAI requests run at once, within the optional
+        tokens_per_minute budget. Emails that already have a draft are skipped.
+        """
+        logger.info(f"\n✍️  Preparing {len(emails)} follow-ups ({workers} at a time)...")
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self.get_followup_body, emails))
+        
+        logger.info(f"✓ {len(emails)} follow-ups ready")
+    
+    def generate_followups_batch(self, emails, poll_interval=60):
+        """
+        Generate follow-ups for many emails with one OpenAI Batch API job
+        
+        All prompts are written to a JSONL file, submitted as a single batch and
+        polled until the job finishes. Results are attached to each email's
+        details; any item that fails falls back to generate_template_followup.
+        """
+        emails = [email for email in emails if not email.get('followup_body')]
+        pending = [email for email in emails if not self.get_cached_followup(email)]
+        if not pending:
+            return
+        self.load_email_bodies(pending)
         
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        logger.info(f"\n📦 Submitting {len(pending)} prompts as an OpenAI batch job...")
+        
+        by_id = {email['id']: email for email in pending}
+        results = {}
+        
+        try:
+            with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+                for email in pending:
+                    f.write(json.dumps({
+                        "custom_id": email['id'],
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": self.build_followup_request(
+                            email['recipient_name'], email['subject'], email['body']
+                        )
+                    }) + "\n")
+                jsonl_path = f.name
+            
+            try:
+                with open(jsonl_path, 'rb') as f:
+                    input_file = self.openai_client.files.create(file=f, purpose='batch')
+            finally:
+                os.remove(jsonl_path)
+            
+            batch = self.openai_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h'
+            )
+            logger.info(f"✓ Batch {batch.id} submitted")
+            
+            while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+                time.sleep(poll_interval)
+                batch = self.openai_client.batches.retrieve(batch.id)
+                logger.info(f"  ⏳ Batch {batch.status}...")
+            
+            if batch.output_file_id:
+                output = self.openai_client.files.content(batch.output_file_id).text
+                for line in output.splitlines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    response = item.get('response') or {}
+                    if response.get('status_code') == 200:
+                        content = response['body']['choices'][0]['message']['content']
+                        self.record_usage(response['body'].get('usage'))
+                        results[item['custom_id']] = content.strip()
+        
+        except Exception as e:
+            logger.warning(f"  ⚠️  Batch generation failed: {e}")
+        
+        for msg_id, email in by_id.items():
+            if results.get(msg_id):
+                self.attach_followup(email, results[msg_id])
+            else:
+                self.attach_followup(email, self.generate_template_followup(
+                    email['recipient_name'], email['subject'], email['body']
+                ), cache=False)
+        
+        logger.info(f"✓ {len(results)} of {len(pending)} follow-ups generated by the batch "
+                    f"({len(pending) - len(results)} used templates)")
+    
+    def build_group_request(self, emails):
+        """Build one structured-output request covering several emails, keyed by their position"""
+        subjects = {email['subject'] for email in emails}
+        shared_subject = subjects.pop() if len(subjects) == 1 else None
+        
+        # Campaigns often share one subject - state it once instead of per email
+        parts = [f"Subject of every email: {shared_subject}"] if shared_subject is not None else []
+        for idx, email in enumerate(emails, 1):
+            parts.append(f"id: {idx}\n" + self.describe_email(
+                email['recipient_name'], email['subject'], email['body'], include_subject=shared_subject is None
+            ))
         
         return {
-            'raw': raw_message,
-            'threadId': thread_id
+            "model": "gpt-4o",
+            "messages": [
+                {"role": "system", "content": FOLLOWUP_SYSTEM_PROMPT + GROUP_INSTRUCTIONS},
+                {"role": "user", "content": '\n\n'.join(parts)}
+            ],
+            "response_format": GROUP_RESPONSE_FORMAT,
+            "max_tokens": 200 * len(emails) + 50,
+            "temperature": 0.8
         }
     
+    def parse_group_response(self, content, emails):
+        """
+        Return {position: body} for the valid entries of a grouped reply
+        
+        An entry is dropped if its id is unknown or repeated, its body is empty
+        or too long, or it doesn't greet its own recipient's first name (a sign
+        the bodies were mixed up).
+        """
+        try:
+            entries = json.loads(content)['followups']
+        except (ValueError, KeyError, TypeError):
+            return {}
+        if not isinstance(entries, list):
+            return {}
+        
+        bodies = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            idx, body = str(entry.get('id', '')).strip(), entry.get('body')
+            if not idx.isdigit() or not 1 <= int(idx) <= len(emails) or int(idx) in bodies:
+                continue
+            if not isinstance(body, str) or not body.strip() or len(body) > MAX_GROUPED_BODY_CHARS:
+                continue
+            
+            recipient_name = emails[int(idx) - 1]['recipient_name']
+            first_name = recipient_name.split()[0] if recipient_name else None
+            if first_name and first_name.lower() not in body.lower():
+                continue
+            bodies[int(idx)] = body.strip()
+        
+        return bodies
+    
+    def generate_group(self, emails):
+        """Generate follow-ups for one group with a single request; failed items fall back to templates"""
+        try:
+            bodies = self.parse_group_response(self.create_completion(self.build_group_request(emails)), emails)
+        except Exception as e:
+            logger.warning(f"  ⚠️  Grouped generation failed for {len(emails)} emails: {e}")
+            bodies = {}
+        
+        for idx, email in enumerate(emails, 1):
+            if idx in bodies:
+                self.attach_followup(email, bodies[idx])
+            else:
+                self.metrics.inc('openai_fallbacks_total')
+                self.attach_followup(email, self.generate_template_followup(
+                    email['recipient_name'], email['subject'], email['body']
+                ), cache=False)
+        
+        return len(bodies)
+    
+    def generate_followups_grouped(self, emails, group_size=DEFAULT_GROUP_SIZE, workers=1):
+        """
+        Generate follow-ups with several recipients per OpenAI request
+        
+        Emails are sorted by subject and packed group_size at a time into one
+        structured-output request that returns a JSON array of bodies, so the
+        instructions (and a shared subject) are sent once per group. Each body
+        is validated; any entry that is missing or malformed falls back to
+        generate_template_followup. Up to `workers` groups run at once.
+        """
+        emails = [email for email in emails if not email.get('followup_body')]
+        pending = sorted((email for email in emails if not self.get_cached_followup(email)),
+                         key=lambda email: email['subject'])
+        if not pending:
+            return
+        self.load_email_bodies(pending)
+        
+        groups = list(chunked(pending, group_size))
+        logger.info(f"\n✍️  Generating {len(pending)} follow-ups in {len(groups)} requests...")
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            generated = sum(pool.map(self.generate_group, groups))
+        
+        logger.info(f"✓ {generated} of {len(pending)} follow-ups generated "
+                    f"({len(pending) - generated} used templates)")
+    
+    def create_followup_message(self, email_details, thread_id):
+        """Create follow-up message"""
+        body = self.get_followup_body(email_details)
+        return build_message(email_details['to'], email_details['subject'], body, thread_id,
+                             email_details.get('message_id'), email_details.get('references'))
+    
     def send_followup(self, email_details):
         """Send follow-up email"""
         try:
             message = self.create_followup_message(email_details, email_details['thread_id'])
             
-            sent_message = self.service.users().messages().send(
+            sent_message = self.gmail.execute(self.service.users().messages().send(
                 userId='me',
                 body=message
-            ).execute()
+            ))
             
             display_name = email_details['recipient_name'] or email_details['recipient_email']
-            print(f"  ✓ Sent to {display_name}")
+            logger.info(f"  ✓ Sent to {display_name}")
             return True
         
         except Exception as e:
-            print(f"  ❌ Failed: {e}")
+            logger.error(f"  ❌ Failed: {e}")
             return False
     
     def preview_followup(self, email_details):
         """Preview the follow-up"""
-        body = self.generate_personalized_followup(
-            email_details['recipient_name'],
-            email_details['subject'],
-            email_details['body']
-        )
+        body = self.get_followup_body(email_details)
         
-        print("\n" + "="*70)
-        print(f"To: {email_details['recipient_name'] or email_details['recipient_email']}")
-        print(f"Email: {email_details['recipient_email']}")
+        logger.info("\n" + "="*70)
+        logger.info(f"To: {email_details['recipient_name'] or email_details['recipient_email']}")
+        logger.info(f"Email: {email_details['recipient_email']}")
         subject = email_details['subject']
         if not subject.startswith('Re:'):
             subject = f'Re: {subject}'
-        print(f"Subject: {subject}")
-        print("-"*70)
-        print(body)
-        print("="*70)
+        logger.info(f"Subject: {subject}")
+        logger.info("-"*70)
+        logger.info(body)
+        logger.info("="*70)
     
-    def run_followup_campaign(self, days_ago=7, subject_keywords=None, dry_run=True, show_previews=False):
-        """Run the campaign"""
-        print("="*70)
-        print(f"🤖 AI EMAIL FOLLOW-UP AGENT {'(OPENAI GPT-4)' if self.use_ai else '(TEMPLATE MODE)'}")
-        print("="*70)
-        
-        sent_messages = self.find_sent_emails(days_ago, subject_keywords)
-        
-        if not sent_messages:
-            print("\n⚠️  No emails found")
-            return
-        
-        total_emails = len(sent_messages)
+    def analyze_message(self, msg):
+        """Return (details, has_reply) for a message stub, from the state store or one thread fetch"""
+        stored = self.get_stored_result(msg)
+        if stored:
+            return stored
+        if msg.get('reply_plan') is False:
+            # No reply per the search - the message headers are enough; the body is loaded only for AI
+            return self.get_email_details(msg['id'], include_body=False), False
+        return self.check_thread(msg['threadId'], msg['id'])
+    
+    def analyze_emails(self, sent_messages):
+        """Check each sent email for replies, one API call at a time"""
+        total_emails = 0
         needs_followup = []
         already_replied = []
         
-        print(f"\n📊 Analyzing {total_emails} emails...\n")
-        
         for idx, msg in enumerate(sent_messages, 1):
-            msg_id = msg['id']
-            details = self.get_email_details(msg_id)
+            total_emails = idx
+            details, has_reply = self.analyze_message(msg)
             
             if not details:
                 continue
             
             display_name = details['recipient_name'] or details['recipient_email']
-            print(f"[{idx}/{total_emails}] {display_name[:40]}...")
+            logger.info(f"[{idx}] {display_name[:40]}...")
             
-            has_reply = self.check_for_reply(details['thread_id'], msg_id)
+            if has_reply:
+                already_replied.append(details)
+                logger.info(f"  ✓ Replied - skip")
+            else:
+                needs_followup.append(details)
+                logger.info(f"  ⚠️  No reply - needs email")
+        
+        return needs_followup, already_replied, total_emails
+    
+    def analyze_emails_batched(self, sent_messages, batch_size=DEFAULT_BATCH_SIZE):
+        """Check sent emails for replies using Gmail HTTP batch requests"""
+        total_emails = 0
+        needs_followup = []
+        already_replied = []
+        
+        threads_api = self.service.users().threads()
+        messages_api = self.service.users().messages()
+        
+        def fetch_request(msg):
+            if msg.get('reply_plan') is False:
+                return messages_api.get(userId='me', id=msg['id'], **FETCH_PROFILES['metadata'])
+            return threads_api.get(userId='me', id=msg['threadId'], **FETCH_PROFILES['metadata'])
+        
+        for chunk in chunked(sent_messages, batch_size):
+            stored_results = {msg['id']: self.get_stored_result(msg) for msg in chunk}
+            thread_results = execute_batched(
+                self.service,
+                [(msg['id'], fetch_request(msg)) for msg in chunk if not stored_results[msg['id']]],
+                batch_size=batch_size,
+                batch_uri=self.batch_uri,
+                executor=self.gmail
+            )
+            
+            for msg in chunk:
+                total_emails += 1
+                
+                stored = stored_results[msg['id']]
+                if stored:
+                    details, has_reply = stored
+                else:
+                    thread, error = thread_results.get(msg['id'], (None, None))
+                    if error or not thread:
+                        logger.error(f"❌ Error checking thread: {error}")
+                        self.metrics.inc('analysis_errors_total', stage='thread')
+                        continue
+                    
+                    if msg.get('reply_plan') is False:
+                        details, has_reply = self.parse_email_details(thread, include_body=False), False
+                    else:
+                        details, has_reply = self.analyze_thread(thread, msg['id'])
+                
+                if not details:
+                    continue
+                
+                display_name = details['recipient_name'] or details['recipient_email']
+                logger.info(f"[{total_emails}] {display_name[:40]}...")
+                
+                if has_reply:
+                    already_replied.append(details)
+                    logger.info(f"  ✓ Replied - skip")
+                else:
+                    needs_followup.append(details)
+                    logger.info(f"  ⚠️  No reply - needs email")
+        
+        return needs_followup, already_replied, total_emails
+    
+    def analyze_emails_concurrent(self, sent_messages, workers=8):
+        """Check sent emails for replies on a pool of worker threads, keeping input order"""
+        total_emails = 0
+        needs_followup = []
+        already_replied = []
+        
+        def record(future):
+            details, has_reply = future.result()
+            if not details:
+                return
+            
+            display_name = details['recipient_name'] or details['recipient_email']
+            logger.info(f"[{total_emails}] {display_name[:40]}...")
             
             if has_reply:
                 already_replied.append(details)
-                print(f"  ✓ Replied - skip")
+                logger.info(f"  ✓ Replied - skip")
             else:
                 needs_followup.append(details)
-                print(f"  ⚠️  No reply - needs email")
+                logger.info(f"  ⚠️  No reply - needs email")
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for msg in sent_messages:
+                pending.append(pool.submit(self.analyze_message, msg))
+                if len(pending) >= workers * 4:
+                    total_emails += 1
+                    record(pending.popleft())
             
-            time.sleep(0.5)
+            while pending:
+                total_emails += 1
+                record(pending.popleft())
         
-        print("\n" + "="*70)
-        print("📊 SUMMARY")
-        print("="*70)
-        print(f"Total: {total_emails} | Replied: {len(already_replied)} | Need follow-up: {len(needs_followup)}")
-        print("="*70)
+        return needs_followup, already_replied, total_emails
+    
+    def run_followup_campaign(self, days_ago=7, subject_keywords=None, dry_run=True, show_previews=False,
+                              batch_size=None, state_db=None, workers=None, generation_workers=None,
+                              batch_api=False, outbox=None, campaign_id=None, skip_replied_recipients=False,
+                              max_followups_per_recipient=None, followup_window_days=FOLLOWUP_WINDOW_DAYS,
+                              plan_replies=False, generation_group_size=None, drafts=None):
+        """
+        Run the campaign
+        
+        Set batch_size to analyze with Gmail batch requests, workers to analyze on
+        a thread pool, and state_db to a SQLite file path to only re-fetch threads
+        that changed since the last run. Set generation_workers to generate every
+        follow-up concurrently before previews and sends, or batch_api=True to
+        generate them all with one (slower, cheaper) OpenAI Batch API job.
+        Set generation_group_size to write that many follow-ups per OpenAI
+        request (with generation_workers requests at once).
+        
+        Set outbox to a SQLite file path to queue prepared messages before
+        sending them. A run that finds unsent entries for campaign_id (default:
+        today's date) resumes sending without analyzing or generating again,
+        and a thread is never queued twice for the same campaign.
+        
+        Set drafts to a SQLite file path to write the follow-ups as Gmail
+        drafts for review instead of sending them (takes precedence over
+        outbox); send_approved_drafts sends the ones still in Gmail later.
+        
+        Set skip_replied_recipients to skip people who replied in any other
+        thread, and max_followups_per_recipient to cap the follow-ups one person
+        gets within followup_window_days. With state_db, threads of recipients
+        already excluded are not fetched at all.
+        
+        Set plan_replies to run the complementary inbound search first and
+        only fetch threads it can't settle (see iter_sent_emails). Ignored with
+        the recipient rules, which need every thread's participants.
+        
+        Returns a summary dict with the number of emails analyzed, replied,
+        needing a follow-up, drafted, sent and failed.
+        """
+        self.reset_metrics()
+        summary = {'total_emails': 0, 'already_replied': 0, 'needs_followup': 0, 'skipped_recipients': 0,
+                   'drafted': 0, 'sent': 0, 'failed': 0, 'dry_run': dry_run}
+        
+        logger.info("="*70)
+        logger.info(f"🤖 AI EMAIL FOLLOW-UP AGENT {'(OPENAI GPT-4)' if self.use_ai else '(TEMPLATE MODE)'}")
+        logger.info("="*70)
+        
+        use_drafts = bool(drafts) and not dry_run
+        # Decided per run; an outbox opened by an earlier run on this agent does not carry over
+        use_outbox = bool(outbox) and not dry_run and not use_drafts
+        if use_drafts:
+            campaign_id = self.start_drafts(drafts, campaign_id)
+        
+        elif use_outbox:
+            campaign_id = self.start_outbox(outbox, campaign_id)
+            counts = self.outbox.counts(campaign_id)
+            unsent = counts.get(Outbox.PENDING, 0) + counts.get(Outbox.SENDING, 0)
+            if unsent:
+                logger.info(f"\n📮 Resuming campaign {campaign_id}: {unsent} queued emails left\n")
+                with self.metrics.stage('send'):
+                    sent, failed = self.drain_outbox(campaign_id)
+                summary.update(sent=sent, failed=failed, resumed=True)
+                logger.info("\n✅ Complete!")
+                return self.record_campaign(summary)
+        
+        self.get_own_addresses()
+        self.start_recipient_index(skip_replied_recipients, max_followups_per_recipient, followup_window_days)
+        history_id = self.start_incremental_scan(state_db) if state_db else None
+        
+        logger.info(f"\n🔍 Searching for emails sent in the last {days_ago} days...")
+        self.planned_replies = 0
+        sent_messages = self.iter_sent_emails(days_ago, subject_keywords,
+                                              plan_replies=plan_replies and not self.recipient_policy)
+        
+        logger.info(f"\n📊 Analyzing emails...\n")
+        
+        with self.metrics.stage('analyze'):
+            if workers:
+                needs_followup, already_replied, total_emails = self.analyze_emails_concurrent(sent_messages, workers)
+            elif batch_size:
+                needs_followup, already_replied, total_emails = self.analyze_emails_batched(sent_messages, batch_size)
+            else:
+                needs_followup, already_replied, total_emails = self.analyze_emails(sent_messages)
+        
+        if state_db:
+            self.finish_incremental_scan(history_id)
+        
+        needs_followup, skipped = self.filter_recipients(needs_followup)
+        
+        # Replies settled by the search were never fetched
+        total_emails += self.planned_replies
+        replied = len(already_replied) + self.planned_replies
+        summary.update(total_emails=total_emails, already_replied=replied,
+                       needs_followup=len(needs_followup), skipped_recipients=skipped)
+        
+        if not total_emails:
+            logger.warning("\n⚠️  No emails found")
+            return self.record_campaign(summary)
+        
+        logger.info("\n" + "="*70)
+        logger.info("📊 SUMMARY")
+        logger.info("="*70)
+        logger.info(f"Total: {total_emails} | Replied: {replied} | Need follow-up: {len(needs_followup)}")
+        if skipped:
+            logger.info(f"Skipped by recipient: {skipped}")
+        logger.info("="*70)
+        
+        if use_drafts:
+            # Threads that already have a Gmail draft in this campaign need no new one
+            needs_followup = [email for email in needs_followup
+                              if not self.draft_store.is_drafted(campaign_id, email['thread_id'])]
+        
+        elif use_outbox:
+            # Threads already queued in this campaign need no new draft
+            needs_followup = [email for email in needs_followup
+                              if not self.outbox.is_queued(campaign_id, email['thread_id'])]
+        
+        with self.metrics.stage('generate'):
+            if batch_api and self.use_ai and needs_followup:
+                self.generate_followups_batch(needs_followup)
+            elif generation_group_size and self.use_ai and needs_followup:
+                self.generate_followups_grouped(needs_followup, generation_group_size, generation_workers or 1)
+            elif generation_workers and needs_followup:
+                self.prepare_followups(needs_followup, generation_workers)
+            elif not self.use_ai and needs_followup:
+                self.templates.render_all(needs_followup)
         
         if show_previews and needs_followup:
-            print("\n📧 SAMPLE PERSONALIZED EMAILS:")
+            logger.info("\n📧 SAMPLE PERSONALIZED EMAILS:")
             for i, email in enumerate(needs_followup[:3], 1):
-                print(f"\n--- Sample {i} ---")
+                logger.info(f"\n--- Sample {i} ---")
                 self.preview_followup(email)
             
             if len(needs_followup) > 3:
-                print(f"\n... and {len(needs_followup) - 3} more")
+                logger.info(f"\n... and {len(needs_followup) - 3} more")
+        
+        if needs_followup and use_drafts:
+            drafted, failed = self.create_followup_drafts(needs_followup, campaign_id, batch_size or DEFAULT_BATCH_SIZE)
+            summary.update(drafted=drafted, failed=failed)
+            logger.info(f"\n📝 Created {drafted} Gmail drafts for campaign {campaign_id}"
+                        f"{f' ({failed} failed)' if failed else ''}")
+            logger.info("💡 Review them in Gmail, delete any you don't want, then run send_approved_drafts")
+        
+        elif needs_followup and use_outbox:
+            queued = self.queue_followups(needs_followup, campaign_id)
+            logger.info(f"\n📮 Queued {queued} emails for campaign {campaign_id}\n")
+            
+            with self.metrics.stage('send'):
+                sent, failed = self.drain_outbox(campaign_id)
+            summary.update(sent=sent, failed=failed)
         
-        if needs_followup:
-            print(f"\n📤 {'[DRY RUN]' if dry_run else 'SENDING'} {len(needs_followup)} emails...\n")
+        elif needs_followup:
+            logger.info(f"\n📤 {'[DRY RUN]' if dry_run else 'SENDING'} {len(needs_followup)} emails...\n")
             
-            for idx, email in enumerate(needs_followup, 1):
-                display_name = email['recipient_name'] or email['recipient_email']
-                print(f"[{idx}/{len(needs_followup)}] {display_name}")
-                
-                if not dry_run:
-                    self.send_followup(email)
-                    time.sleep(2)
-                else:
-                    print(f"  [DRY RUN] Would send")
+            with self.metrics.stage('send'):
+                for idx, email in enumerate(needs_followup, 1):
+                    display_name = email['recipient_name'] or email['recipient_email']
+                    logger.info(f"[{idx}/{len(needs_followup)}] {display_name}")
+                    
+                    if not dry_run:
+                        self.metrics.observe('rate_limit_wait_seconds', self.send_limiter.acquire(), limiter='send')
+                        sent = self.send_followup(email)
+                        summary['sent' if sent else 'failed'] += 1
+                        self.metrics.inc('followups_total', result='sent' if sent else 'failed')
+                    else:
+                        logger.info(f"  [DRY RUN] Would send")
         
-        print("\n✅ Complete!")
+        logger.info("\n✅ Complete!")
         
         if dry_run:
-            print("\n⚠️  DRY RUN - no emails sent")
-            print("💡 Set DRY_RUN=False to send")
+            logger.info("\n⚠️  DRY RUN - no emails sent")
+            logger.info("💡 Set DRY_RUN=False to send")
+        
+        return self.record_campaign(summary)
 
 
 def main():
     """Main execution"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     
     # Initialize agent (set use_ai=False to disable OpenAI API)
-    agent = OpenAIEmailFollowupAgent(use_ai=True)
+    # Generated drafts are cached on disk so previews and re-runs don't pay for them twice
+    agent = OpenAIEmailFollowupAgent(use_ai=True, generation_cache='generation_cache.db')
     
     # Configuration
     DAYS_BACK = 14
@@ -411,11 +961,11 @@ def main():
     DRY_RUN = True
     SHOW_PREVIEWS = True
     
-    print("\n⚙️  Settings:")
-    print(f"   Days: {DAYS_BACK}")
-    print(f"   Keywords: {SUBJECT_KEYWORDS if SUBJECT_KEYWORDS else 'All'}")
-    print(f"   Dry run: {DRY_RUN}")
-    print(f"   Previews: {SHOW_PREVIEWS}")
+    logger.info("\n⚙️  Settings:")
+    logger.info(f"   Days: {DAYS_BACK}")
+    logger.info(f"   Keywords: {SUBJECT_KEYWORDS if SUBJECT_KEYWORDS else 'All'}")
+    logger.info(f"   Dry run: {DRY_RUN}")
+    logger.info(f"   Previews: {SHOW_PREVIEWS}")
     
     agent.run_followup_campaign(
         days_ago=DAYS_BACK,
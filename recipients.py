@@ -0,0 +1,155 @@
+"""
+Recipient parsing and the per-run recipient index
+Parses To/Cc headers with a real address parser, memoizes the name and
+address normalization, and groups our threads by recipient so per-person
+questions ("replied anywhere?", "follow-ups this week?") are dict lookups
+"""
+
+import re
+import threading
+import time
+from collections import defaultdict
+from email.utils import getaddresses
+from functools import lru_cache
+
+from gmail_client import header_dict, is_own_message, normalize_address
+
+# Cached header values and names; a campaign rarely sees more distinct recipients than this
+PARSE_CACHE_SIZE = 8192
+
+# Default window for the per-recipient follow-up cap
+FOLLOWUP_WINDOW_DAYS = 7
+
+LOCAL_PART_SEPARATORS_RE = re.compile(r'[._-]')
+
+REPLIED = 'replied_elsewhere'
+FOLLOWUP_LIMIT = 'followup_limit'
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_recipients(*header_values):
+    """
+    Parse To/Cc header values into a tuple of (name, address) pairs
+
+    Addresses are lower-cased and de-duplicated in header order, and entries
+    without a usable address (group syntax, undisclosed-recipients) are dropped.
+    """
+    recipients = []
+    seen = set()
+    for name, address in getaddresses([value for value in header_values if value]):
+        address = address.strip().lower()
+        if '@' not in address or address in seen:
+            continue
+        seen.add(address)
+        recipients.append((name.replace('"', '').replace("'", '').strip(), address))
+    return tuple(recipients)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def display_name(name, address):
+    """Return the display name, or one derived from the address ('john.doe@...' -> 'John Doe')"""
+    if name:
+        return name
+    parts = LOCAL_PART_SEPARATORS_RE.split(address.split('@')[0])
+    return ' '.join(part.capitalize() for part in parts if len(part) > 1) or None
+
+
+def thread_activity(thread, own_addresses):
+    """
+    Return (repliers, followup_times) for a fetched thread
+
+    repliers are the addresses of everyone else who wrote in the thread;
+    followup_times are the send times (epoch seconds) of our messages after
+    the first one, i.e. the follow-ups the thread has already had.
+    """
+    repliers = set()
+    own_times = []
+    for msg in thread.get('messages', []):
+        if is_own_message(msg, own_addresses):
+            own_times.append(int(msg['internalDate']) / 1000)
+        else:
+            address = normalize_address(header_dict(msg['payload']).get('from'))
+            if address:
+                repliers.add(address)
+    return sorted(repliers), sorted(own_times)[1:]
+
+
+class RecipientIndex:
+    """
+    Our sent threads grouped by recipient address, built once per run
+
+    Filled from the state store at the start of an incremental scan and from
+    each thread as it is analyzed. Safe to update from analysis workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.thread_recipients = {}
+        self.threads_by_recipient = defaultdict(set)
+        self.replied = set()
+        # address -> {thread_id: follow-up times}, so re-indexing a thread replaces its entry
+        self.followups = defaultdict(dict)
+
+    def add_thread(self, thread_id, recipients, repliers=(), followup_times=()):
+        """Record one thread: who we wrote to, who wrote back and when we followed up"""
+        with self._lock:
+            self.thread_recipients[thread_id] = tuple(recipients)
+            for address in recipients:
+                self.threads_by_recipient[address].add(thread_id)
+                self.followups[address][thread_id] = tuple(followup_times)
+                if address in repliers:
+                    self.replied.add(address)
+
+    def add_details(self, details, has_reply=False):
+        """Record a thread from its stored details (as saved by analyze_thread)"""
+        recipients = details.get('recipients') or []
+        repliers = details.get('repliers')
+        if repliers is None:
+            # Rows saved before the index existed only know whether anyone replied
+            repliers = recipients if has_reply else ()
+        self.add_thread(details['thread_id'], recipients, repliers, details.get('followup_times', ()))
+
+    def load(self, state_store):
+        """Index every thread in a ThreadStateStore"""
+        count = 0
+        for has_reply, details in state_store.iter_threads():
+            if details.get('thread_id'):
+                self.add_details(details, has_reply)
+                count += 1
+        return count
+
+    def recipients_of(self, thread_id):
+        return self.thread_recipients.get(thread_id)
+
+    def has_replied(self, address):
+        """Whether this person has written back in any of our threads"""
+        return address in self.replied
+
+    def followups_since(self, address, since):
+        """How many follow-ups this person has received since the given epoch time"""
+        with self._lock:
+            threads = list(self.followups.get(address, {}).values())
+        return sum(1 for times in threads for sent_at in times if sent_at >= since)
+
+    def skip_reason(self, recipients, skip_replied=False, max_followups=None, window_days=FOLLOWUP_WINDOW_DAYS,
+                    planned=None):
+        """
+        Return why a follow-up to these recipients should be skipped, or None
+
+        A thread is skipped only when every recipient is excluded. planned
+        counts follow-ups already chosen in this run, per address.
+        """
+        if not recipients or (not skip_replied and max_followups is None):
+            return None
+
+        since = time.time() - window_days * 24 * 3600
+        reasons = []
+        for address in recipients:
+            if skip_replied and self.has_replied(address):
+                reasons.append(REPLIED)
+            elif max_followups is not None and (
+                    self.followups_since(address, since) + (planned or {}).get(address, 0) >= max_followups):
+                reasons.append(FOLLOWUP_LIMIT)
+            else:
+                return None
+        return reasons[0]
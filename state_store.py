@@ -0,0 +1,447 @@
+"""
+Persistent local state for follow-up campaigns
+Stores each thread's last analyzed historyId and reply status, caches
+generated follow-up bodies, queues prepared sends and tracks Gmail drafts
+awaiting approval, in SQLite
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class ThreadStateStore:
+    """SQLite-backed record of analyzed threads and the mailbox history position"""
+
+    def __init__(self, path='followup_state.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                message_id TEXT NOT NULL,
+                history_id TEXT,
+                has_reply INTEGER NOT NULL,
+                details TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+
+    def get_thread(self, thread_id):
+        """Return the stored state for a thread, or None if it was never analyzed"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT message_id, history_id, has_reply, details FROM threads WHERE thread_id = ?',
+                (thread_id,)
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'message_id': row[0],
+            'history_id': row[1],
+            'has_reply': bool(row[2]),
+            'details': json.loads(row[3]),
+        }
+
+    def save_thread(self, thread_id, message_id, history_id, has_reply, details):
+        """Record the analysis result for a thread"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO threads VALUES (?, ?, ?, ?, ?, ?)',
+                (thread_id, message_id, history_id, int(has_reply), json.dumps(details), time.time())
+            )
+            self._conn.commit()
+
+    def iter_threads(self):
+        """Yield (has_reply, details) for every analyzed thread"""
+        with self._lock:
+            rows = self._conn.execute('SELECT has_reply, details FROM threads').fetchall()
+
+        for has_reply, details in rows:
+            yield bool(has_reply), json.loads(details)
+
+    def get_meta(self, key, default=None):
+        """Read a stored setting such as the mailbox historyId"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Store a setting such as the mailbox historyId"""
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, str(value)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class GenerationCache:
+    """
+    SQLite-backed cache of generated follow-up bodies
+
+    Entries expire after ttl_seconds, and the least recently used entries are
+    evicted once more than max_entries are stored.
+    """
+
+    def __init__(self, path='generation_cache.db', ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS generations (
+                cache_key TEXT PRIMARY KEY,
+                thread_id TEXT,
+                body TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(message_id, recipient, subject):
+        """
+        Build a cache key from the original message's Gmail ID, the recipient and the subject
+
+        A sent message never changes, so its ID stands in for its body and the
+        cache can be checked before the body is fetched.
+        """
+        return hashlib.sha256(f"{message_id}\n{recipient}\n{subject}".encode('utf-8')).hexdigest()
+
+    def get(self, cache_key):
+        """Return the cached body, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body, created_at FROM generations WHERE cache_key = ?', (cache_key,)
+            ).fetchone()
+            if not row:
+                return None
+
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute('DELETE FROM generations WHERE cache_key = ?', (cache_key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute('UPDATE generations SET last_used = ? WHERE cache_key = ?', (now, cache_key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, cache_key, body, thread_id=None):
+        """Store a generated body, evicting the least recently used entries if over capacity"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?)',
+                (cache_key, thread_id, body, now, now)
+            )
+            self._conn.execute('DELETE FROM generations WHERE created_at < ?', (now - self.ttl_seconds,))
+            self._conn.execute("""
+                DELETE FROM generations WHERE cache_key IN (
+                    SELECT cache_key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Outbox:
+    """
+    SQLite-backed queue of prepared follow-up messages
+
+    Each entry holds the ready-to-send Gmail message body under an idempotency
+    key of campaign id plus thread id, so a thread is queued at most once per
+    campaign. Entries move from pending to sending to sent (or failed), which
+    lets an interrupted run resume exactly where it stopped.
+    """
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    def __init__(self, path='outbox.db', max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                campaign_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                recipient TEXT,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                gmail_id TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_campaign_status ON outbox (campaign_id, status);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(campaign_id, thread_id):
+        return f"{campaign_id}:{thread_id}"
+
+    def enqueue(self, campaign_id, thread_id, recipient, message):
+        """Queue a message; returns False if this thread is already queued for the campaign"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, campaign_id, thread_id, recipient, message, status, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.make_key(campaign_id, thread_id), campaign_id, thread_id, recipient, json.dumps(message),
+                 self.PENDING, now, now)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def enqueue_many(self, campaign_id, entries):
+        """Queue (thread_id, recipient, message) entries in one transaction; returns how many were new"""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, campaign_id, thread_id, recipient, message, status, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(self.make_key(campaign_id, thread_id), campaign_id, thread_id, recipient, json.dumps(message),
+                  self.PENDING, now, now) for thread_id, recipient, message in entries]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def is_queued(self, campaign_id, thread_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM outbox WHERE idempotency_key = ?', (self.make_key(campaign_id, thread_id),)
+            ).fetchone()
+        return row is not None
+
+    def entries(self, campaign_id, status):
+        """Return the campaign's entries in a status, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT idempotency_key, thread_id, recipient, message, attempts, updated_at FROM outbox '
+                'WHERE campaign_id = ? AND status = ? ORDER BY created_at, idempotency_key',
+                (campaign_id, status)
+            ).fetchall()
+
+        return [{
+            'key': row[0],
+            'thread_id': row[1],
+            'recipient': row[2],
+            'message': json.loads(row[3]),
+            'attempts': row[4],
+            'updated_at': row[5],
+        } for row in rows]
+
+    def _set_status(self, key, status, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE outbox SET status = ?, updated_at = ?{', ' + assignments if assignments else ''} "
+                f"WHERE idempotency_key = ?",
+                (status, time.time(), *fields.values(), key)
+            )
+            self._conn.commit()
+
+    def mark_sending(self, key):
+        """Claim an entry right before it is sent"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE idempotency_key = ?',
+                (self.SENDING, time.time(), key)
+            )
+            self._conn.commit()
+
+    def mark_sent(self, key, gmail_id=None):
+        self._set_status(key, self.SENT, gmail_id=gmail_id, error=None)
+
+    def mark_failed(self, key, error, attempts):
+        """Return a failed entry to the queue, or give up on it after max_attempts"""
+        status = self.FAILED if attempts >= self.max_attempts else self.PENDING
+        self._set_status(key, status, error=str(error))
+        return status
+
+    def mark_unconfirmed(self, key, error):
+        """
+        Record a send that failed without a clear answer (timeout, 5xx)
+
+        The entry stays claimed with its claim time, so the next run checks
+        the thread to see whether the message went out before sending again.
+        """
+        with self._lock:
+            self._conn.execute('UPDATE outbox SET error = ? WHERE idempotency_key = ?', (str(error), key))
+            self._conn.commit()
+
+    def release(self, key):
+        """Put a claimed entry back in the queue, e.g. when its send is known not to have happened"""
+        self._set_status(key, self.PENDING)
+
+    def counts(self, campaign_id):
+        """Return the number of entries in each status for a campaign"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, COUNT(*) FROM outbox WHERE campaign_id = ? GROUP BY status', (campaign_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DraftStore:
+    """
+    SQLite-backed record of follow-ups written as Gmail drafts
+
+    Each entry maps a campaign's thread to the Gmail draft created for it, so
+    a thread gets at most one draft per campaign. Entries move from drafted to
+    sending to sent, or to discarded when the reviewer deleted the draft.
+    """
+
+    DRAFTED = 'drafted'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DISCARDED = 'discarded'
+    FAILED = 'failed'
+
+    def __init__(self, path='drafts.db', max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS drafts (
+                idempotency_key TEXT PRIMARY KEY,
+                campaign_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                recipient TEXT,
+                draft_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                gmail_id TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS drafts_campaign_status ON drafts (campaign_id, status);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(campaign_id, thread_id):
+        return f"{campaign_id}:{thread_id}"
+
+    def add_many(self, campaign_id, entries):
+        """Record (thread_id, recipient, draft_id) entries in one transaction; returns how many were new"""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO drafts (idempotency_key, campaign_id, thread_id, recipient, draft_id, status, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(self.make_key(campaign_id, thread_id), campaign_id, thread_id, recipient, draft_id,
+                  self.DRAFTED, now, now) for thread_id, recipient, draft_id in entries]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def is_drafted(self, campaign_id, thread_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM drafts WHERE idempotency_key = ?', (self.make_key(campaign_id, thread_id),)
+            ).fetchone()
+        return row is not None
+
+    def entries(self, campaign_id, status):
+        """Return the campaign's entries in a status, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT idempotency_key, thread_id, recipient, draft_id, attempts, updated_at FROM drafts '
+                'WHERE campaign_id = ? AND status = ? ORDER BY created_at, idempotency_key',
+                (campaign_id, status)
+            ).fetchall()
+
+        return [{
+            'key': row[0],
+            'thread_id': row[1],
+            'recipient': row[2],
+            'draft_id': row[3],
+            'attempts': row[4],
+            'updated_at': row[5],
+        } for row in rows]
+
+    def _set_status(self, key, status, **fields):
+        assignments = ''.join(f", {name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE drafts SET status = ?, updated_at = ?{assignments} WHERE idempotency_key = ?",
+                (status, time.time(), *fields.values(), key)
+            )
+            self._conn.commit()
+
+    def mark_sending(self, key):
+        """Claim an entry right before its draft is sent"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE drafts SET status = ?, attempts = attempts + 1, updated_at = ? WHERE idempotency_key = ?',
+                (self.SENDING, time.time(), key)
+            )
+            self._conn.commit()
+
+    def mark_sent(self, key, gmail_id=None):
+        self._set_status(key, self.SENT, gmail_id=gmail_id, error=None)
+
+    def mark_discarded(self, key):
+        self._set_status(key, self.DISCARDED)
+
+    def mark_failed(self, key, error, attempts):
+        """Keep a draft whose send failed for the next run, or give up on it after max_attempts"""
+        status = self.FAILED if attempts >= self.max_attempts else self.DRAFTED
+        self._set_status(key, status, error=str(error))
+        return status
+
+    def mark_unconfirmed(self, key, error):
+        """Record a draft send that failed without a clear answer; the entry stays claimed with its claim time"""
+        with self._lock:
+            self._conn.execute('UPDATE drafts SET error = ? WHERE idempotency_key = ?', (str(error), key))
+            self._conn.commit()
+
+    def release(self, key):
+        """Return a claimed entry to drafted, e.g. when its draft is known not to have been sent"""
+        self._set_status(key, self.DRAFTED)
+
+    def counts(self, campaign_id):
+        """Return the number of entries in each status for a campaign"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, COUNT(*) FROM drafts WHERE campaign_id = ? GROUP BY status', (campaign_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,160 @@
+"""
+Template-based follow-up bodies for the non-AI path
+Loads a directory of string.Template files once, compiles each to a format
+string, picks a category with one precompiled keyword regex and a variant
+by a stable hash, so thousands of bodies render without any LLM calls
+"""
+
+import json
+import os
+import re
+import zlib
+from functools import lru_cache
+from string import Template
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Category used when no keyword matches; its directory must exist
+DEFAULT_CATEGORY = 'general'
+
+# Characters of the original body searched for keywords after the subject
+CLASSIFY_BODY_CHARS = 500
+
+SUBJECT_PREFIX_RE = re.compile(r'^(?:\s*(?:re|fwd?|fw)\s*:\s*)+', re.IGNORECASE)
+
+# Placeholders render() fills in
+TEMPLATE_FIELDS = frozenset({'greeting', 'first_name', 'name', 'topic'})
+
+
+def compile_template(text):
+    """Turn string.Template text into an equivalent str.format string ($name -> {name})"""
+    def convert(match):
+        if match.group('escaped') is not None:
+            return '$'
+        name = match.group('named') or match.group('braced')
+        if name is None:
+            raise ValueError(f"Invalid placeholder in template at position {match.start()}")
+        return '{' + name + '}'
+
+    # Literal braces must survive str.format; placeholders are matched first, so ${name} keeps its braces
+    parts, end = [], 0
+    for match in Template.pattern.finditer(text):
+        parts += [text[end:match.start()].replace('{', '{{').replace('}', '}}'), convert(match)]
+        end = match.end()
+    parts.append(text[end:].replace('{', '{{').replace('}', '}}'))
+    return ''.join(parts)
+
+
+def template_fields(text):
+    """Return the placeholder names used in string.Template text"""
+    return {match.group('named') or match.group('braced') for match in Template.pattern.finditer(text)} - {None}
+
+
+def build_classifier(keywords):
+    """
+    Compile {category: [keywords]} into one regex with a named group per category
+
+    Keywords match whole words, case-insensitively, with an optional plural 's'.
+    A search returns the keyword that starts earliest in the text; categories
+    listed first only win when two keywords start at the same position.
+    """
+    groups = []
+    for category, words in keywords.items():
+        if not category.isidentifier():
+            raise ValueError(f"Template category must be an identifier: {category!r}")
+        alternatives = '|'.join(r'\s+'.join(map(re.escape, word.split()))
+                                for word in sorted(words, key=len, reverse=True))
+        groups.append(f"(?P<{category}>{alternatives})")
+    if not groups:
+        return None
+    return re.compile(r'\b(?:' + '|'.join(groups) + r')s?\b', re.IGNORECASE)
+
+
+class TemplateEngine:
+    """
+    Compiled follow-up templates, loaded from a directory
+
+    The directory holds one sub-directory of .txt templates per category and
+    categories.json mapping each category to its keywords (see build_classifier
+    for which category wins when several match).
+    Templates may use $greeting, $first_name, $name and $topic (the subject
+    without Re:/Fwd: prefixes). signoff, if set, is appended to every body.
+    """
+
+    def __init__(self, directory=TEMPLATES_DIR, signoff=None):
+        self.directory = directory
+        with open(os.path.join(directory, 'categories.json'), encoding='utf-8') as f:
+            keywords = json.load(f)
+
+        self.templates = {}
+        for category in set(keywords) | {DEFAULT_CATEGORY}:
+            category_dir = os.path.join(directory, category)
+            names = sorted(name for name in os.listdir(category_dir) if name.endswith('.txt')) \
+                if os.path.isdir(category_dir) else []
+            if not names:
+                raise ValueError(f"No templates for category '{category}' in {directory}")
+
+            compiled = []
+            for name in names:
+                path = os.path.join(category_dir, name)
+                with open(path, encoding='utf-8') as f:
+                    text = f.read().strip() + (f"\n\n{signoff}" if signoff else '')
+                # Caught here rather than as a KeyError on the first render
+                unknown = template_fields(text) - TEMPLATE_FIELDS
+                if unknown:
+                    used = ', '.join(sorted('$' + field for field in unknown))
+                    allowed = ', '.join(sorted('$' + field for field in TEMPLATE_FIELDS))
+                    raise ValueError(f"Unknown placeholder(s) {used} in template {path}; use {allowed}")
+                try:
+                    compiled.append(compile_template(text))
+                except ValueError as e:
+                    raise ValueError(f"{e} of {path}") from e
+            self.templates[category] = compiled
+
+        self.classifier = build_classifier(keywords)
+
+    def classify(self, subject, body=''):
+        """Return the template category for an email; keywords in the subject win over the body"""
+        if self.classifier:
+            for text in (subject, body[:CLASSIFY_BODY_CHARS] if body else ''):
+                match = self.classifier.search(text)
+                if match:
+                    return match.lastgroup
+        return DEFAULT_CATEGORY
+
+    def render(self, recipient_name, subject, body='', key=None):
+        """
+        Render the follow-up body for one email
+
+        The variant within the category is chosen by a hash of key (default:
+        recipient and subject), so the same email always gets the same text.
+        """
+        variants = self.templates[self.classify(subject, body)]
+        key = key or f"{recipient_name}\n{subject}"
+        template = variants[zlib.crc32(key.encode('utf-8')) % len(variants)] if len(variants) > 1 else variants[0]
+
+        first_name = recipient_name.split()[0] if recipient_name else ''
+        return template.format_map({
+            'greeting': f"Hi {first_name}," if first_name else "Hi,",
+            'first_name': first_name,
+            'name': recipient_name or '',
+            'topic': SUBJECT_PREFIX_RE.sub('', subject).strip() or 'my previous email',
+        })
+
+    def render_all(self, emails):
+        """Set 'followup_body' on every email dict that has none; returns how many were rendered"""
+        rendered = 0
+        for email in emails:
+            if email.get('followup_body'):
+                continue
+            email['followup_body'] = self.render(
+                email.get('recipient_name'), email['subject'], email.get('body') or email.get('snippet') or ''
+            )
+            rendered += 1
+        return rendered
+
+
+@lru_cache(maxsize=None)
+def load_templates(directory=TEMPLATES_DIR, signoff=None):
+    """Return the engine for a template directory, loading and compiling it only once per process"""
+    return TemplateEngine(directory, signoff)
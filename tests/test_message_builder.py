@@ -0,0 +1,72 @@
+import base64
+from email import message_from_bytes, policy
+
+import pytest
+
+from message_builder import (
+    build_messages, build_raw, encode_address, encode_address_header, fold_ids, reply_subject, MAX_LINE_LENGTH
+)
+
+
+def decode_raw(raw):
+    return base64.urlsafe_b64decode(raw)
+
+
+def test_reply_subject_adds_single_prefix():
+    assert reply_subject('Hello') == 'Re: Hello'
+    assert reply_subject('RE: Hello') == 'RE: Hello'
+    assert reply_subject(None) == 'Re: '
+
+
+def test_fold_ids_one_per_line():
+    assert fold_ids('<a@x> <b@x>  <c@x>') == '<a@x>\r\n <b@x>\r\n <c@x>'
+
+
+def test_long_references_stay_under_line_limit():
+    references = ' '.join(f'<{"m" * 60}{i}@mail.example.com>' for i in range(200))
+    raw = decode_raw(build_raw('bob@example.com', 'Hello', 'Body', '<last@mail.example.com>', references))
+    assert max(len(line) for line in raw.split(b'\r\n')) <= MAX_LINE_LENGTH
+
+    message = message_from_bytes(raw, policy=policy.default)
+    ids = message['References'].split()
+    assert len(ids) == 201
+    assert ids[-1] == '<last@mail.example.com>'
+    assert message['In-Reply-To'] == '<last@mail.example.com>'
+
+
+def test_non_ascii_subject_and_body_round_trip():
+    raw = decode_raw(build_raw('bob@example.com', 'Café', 'Grüße aus Köln'))
+    message = message_from_bytes(raw, policy=policy.default)
+    assert message['Subject'] == 'Re: Café'
+    assert message.get_content().strip() == 'Grüße aus Köln'
+    assert raw.isascii()
+
+
+def test_long_ascii_body_lines_are_base64_encoded():
+    raw = decode_raw(build_raw('bob@example.com', 'Hello', 'x' * (MAX_LINE_LENGTH + 1)))
+    assert b'Content-Transfer-Encoding: base64' in raw
+    assert max(len(line) for line in raw.split(b'\r\n')) <= MAX_LINE_LENGTH
+
+
+def test_encode_address_idna_domain():
+    assert encode_address('bob@bücher.example') == 'bob@xn--bcher-kva.example'
+    assert encode_address('bob@example.com') == 'bob@example.com'
+
+
+def test_encode_address_rejects_non_ascii_local_part():
+    with pytest.raises(ValueError):
+        encode_address('jösé@example.com')
+
+
+def test_encode_address_header_encodes_display_name():
+    header = encode_address_header('José Núñez <jose@bücher.example>')
+    assert header.isascii()
+    assert header.endswith('<jose@xn--bcher-kva.example>')
+
+
+def test_build_messages_reports_bad_drafts_individually():
+    good = {'to': 'bob@example.com', 'subject': 'Hi', 'followup_body': 'Body', 'thread_id': 't1'}
+    bad = dict(good, to='jösé@example.com', thread_id='t2')
+    (message, error), (bad_message, bad_error) = build_messages([good, bad])
+    assert error is None and message['threadId'] == 't1'
+    assert bad_message is None and isinstance(bad_error, ValueError)
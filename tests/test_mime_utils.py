@@ -0,0 +1,79 @@
+import base64
+
+from mime_utils import decode_prefix, extract_body_text, part_charset, part_text
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def text_part(text, mime_type='text/plain', charset='utf-8', encoding=None):
+    return {
+        'mimeType': mime_type,
+        'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+        'body': {'data': encode(text.encode(encoding or charset))},
+    }
+
+
+def test_decode_prefix_whole_body():
+    assert decode_prefix(encode(b'hello world')) == (b'hello world', False)
+
+
+def test_decode_prefix_stops_at_budget():
+    raw, more = decode_prefix(encode(b'x' * 3000), max_bytes=100)
+    assert more
+    assert 100 <= len(raw) < 200
+    assert raw == b'x' * len(raw)
+
+
+def test_decode_prefix_invalid_base64():
+    assert decode_prefix('*not base64*') == (b'', False)
+
+
+def test_part_charset_declared():
+    assert part_charset(text_part('', charset='ISO-8859-1')) == 'iso8859-1'
+
+
+def test_part_charset_falls_back_to_utf8():
+    assert part_charset(text_part('', charset='x-unknown-charset', encoding='utf-8')) == 'utf-8'
+    assert part_charset({'headers': []}) == 'utf-8'
+
+
+def test_part_text_uses_declared_charset():
+    part = text_part('Café crème', charset='iso-8859-1')
+    assert part_text(part, None, False, False) == 'Café crème'
+
+
+def test_html_prefix_drops_unclosed_block():
+    # The style block is still open where the first prefix ends; its CSS must not leak into the text
+    markup = '<html><style>' + 'p { color: red; } ' * 200 + '</style><p>Hello there</p></html>'
+    part = text_part(markup, mime_type='text/html')
+    text = part_text(part, 5, True, False)
+    assert 'color' not in text
+    assert text == 'Hello'
+
+
+def test_html_prefix_drops_cut_off_tag():
+    part = text_part('<p>' + 'word ' * 400 + '</p>', mime_type='text/html')
+    text = part_text(part, 20, True, False)
+    assert '<' not in text
+    assert text.startswith('word word')
+
+
+def test_extract_body_prefers_plain_over_html():
+    payload = {
+        'mimeType': 'multipart/alternative',
+        'parts': [text_part('<p>HTML version</p>', mime_type='text/html'), text_part('Plain version')],
+    }
+    assert extract_body_text(payload) == 'Plain version'
+
+
+def test_extract_body_strips_quoted_reply():
+    body = 'Thanks, that works.\n\nOn Mon, Jan 1, 2024 at 9:00 AM Bob <bob@example.com> wrote:\n> Earlier text\n'
+    assert extract_body_text({'mimeType': 'text/plain', **text_part(body)}) == 'Thanks, that works.'
+
+
+def test_extract_body_skips_attachments():
+    attachment = dict(text_part('attached notes'), filename='notes.txt')
+    payload = {'mimeType': 'multipart/mixed', 'parts': [attachment, text_part('The body')]}
+    assert extract_body_text(payload) == 'The body'
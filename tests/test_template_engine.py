@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from template_engine import build_classifier, compile_template, template_fields, TemplateEngine, DEFAULT_CATEGORY
+
+
+def write_templates(root, categories, templates):
+    (root / 'categories.json').write_text(json.dumps(categories), encoding='utf-8')
+    for category, texts in templates.items():
+        (root / category).mkdir()
+        for i, text in enumerate(texts, 1):
+            (root / category / f'{i}.txt').write_text(text, encoding='utf-8')
+    return str(root)
+
+
+def test_compile_template_escapes_braces_and_dollars():
+    compiled = compile_template('$greeting {literal} costs $$5 for ${topic}')
+    assert compiled.format(greeting='Hi,', topic='lunch') == 'Hi, {literal} costs $5 for lunch'
+
+
+def test_compile_template_rejects_invalid_placeholder():
+    with pytest.raises(ValueError):
+        compile_template('Price: $5')
+
+
+def test_template_fields():
+    assert template_fields('$greeting ${topic} $$escaped') == {'greeting', 'topic'}
+
+
+def test_unknown_placeholder_fails_at_load(tmp_path):
+    directory = write_templates(tmp_path, {}, {'general': ['$greeting about $subject']})
+    with pytest.raises(ValueError, match=r'\$subject'):
+        TemplateEngine(directory)
+
+
+def test_missing_default_category_fails_at_load(tmp_path):
+    directory = write_templates(tmp_path, {'job': ['job']}, {'job': ['$greeting']})
+    with pytest.raises(ValueError, match=DEFAULT_CATEGORY):
+        TemplateEngine(directory)
+
+
+def test_classifier_leftmost_keyword_wins():
+    classifier = build_classifier({'job': ['job'], 'meeting': ['meeting']})
+    assert classifier.search('Meeting about the job').lastgroup == 'meeting'
+    assert classifier.search('Job meeting').lastgroup == 'job'
+
+
+def test_classifier_whole_words_and_plurals():
+    classifier = build_classifier({'meeting': ['call', 'catch up']})
+    assert classifier.search('Two calls this week').lastgroup == 'meeting'
+    assert classifier.search('Time to catch   up?').lastgroup == 'meeting'
+    assert classifier.search('Recalled the order') is None
+
+
+def test_render_classifies_and_fills_placeholders(tmp_path):
+    directory = write_templates(
+        tmp_path,
+        {'job': ['application']},
+        {'general': ['$greeting just checking in on $topic.'], 'job': ['$greeting any news on $topic, $first_name?']},
+    )
+    engine = TemplateEngine(directory, signoff='Best,\nAlex')
+    assert engine.render('Dana Smith', 'Re: Fwd: My application') == \
+        'Hi Dana, any news on My application, Dana?\n\nBest,\nAlex'
+    assert engine.render(None, 'Lunch') == 'Hi, just checking in on Lunch.\n\nBest,\nAlex'
+    assert engine.classify('Hello', 'Following up on my application') == 'job'
+
+
+def test_render_variant_is_stable(tmp_path):
+    directory = write_templates(tmp_path, {}, {'general': ['A $name', 'B $name', 'C $name']})
+    engine = TemplateEngine(directory)
+    assert len({engine.render('Dana', 'Hello') for _ in range(5)}) == 1
+
+
+def test_render_all_keeps_existing_bodies(tmp_path):
+    directory = write_templates(tmp_path, {}, {'general': ['$greeting']})
+    emails = [{'recipient_name': 'Dana', 'subject': 'Hi', 'followup_body': 'Already written'},
+              {'recipient_name': 'Lee', 'subject': 'Hi'}]
+    assert TemplateEngine(directory).render_all(emails) == 1
+    assert [email['followup_body'] for email in emails] == ['Already written', 'Hi Lee,']